@@ -0,0 +1,184 @@
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List, Optional
+import argparse
+import threading
+import hashlib
+import json
+import time
+
+
+WORDS = ("the", "model", "answers", "with", "a", "short", "sentence", "about", "local", "chat", "tokens",
+         "stream", "quickly", "and", "then", "stops", "here", "is", "some", "code", "for", "you", "to", "read")
+
+
+class FakeOllama:
+    """
+    A deterministic stand-in for the parts of Ollama's API kosmos.chat uses.
+
+    Every reply is tokens words long, picked from a fixed list by a hash of the request, so the
+    same request always gets the same answer. The first token comes after latency seconds
+    (standing in for prompt evaluation), the next ones at token_rate tokens per second.
+    The final chunk carries eval_count/eval_duration and the other counters Ollama reports.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token_rate: float = 200.0, latency: float = 0.05,
+                 tokens: int = 64, models: Optional[List[str]] = None, context_length: int = 8192):
+        """
+        :param port: 0 picks a free port, see url.
+        :param token_rate: Tokens streamed per second, 0 streams as fast as possible.
+        :param latency: Seconds before the first token.
+        :param tokens: Tokens per reply.
+        :param models: The model names /api/tags lists.
+        :param context_length: The context length /api/show reports.
+        """
+        self.token_rate = token_rate
+        self.latency = latency
+        self.tokens = tokens
+        self.models = models or ["fake:latest"]
+        self.context_length = context_length
+        self.requests: Dict[str, int] = {}
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True, name="fake-ollama")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def reply(self, payload: Dict) -> List[str]:
+        """The tokens of the reply to a request."""
+        seed = hashlib.sha256(json.dumps(payload.get("messages") or payload.get("prompt"), sort_keys=True).encode()).digest()
+        return [WORDS[seed[i % len(seed)] % len(WORDS)] + " " for i in range(self.tokens)]
+
+    def embedding(self, text: str, dim: int = 16) -> List[float]:
+        """A deterministic embedding of a text, the same for the same text."""
+        seed = hashlib.sha256(text.encode()).digest()
+        return [seed[i % len(seed)] / 255 - 0.5 for i in range(dim)]
+
+    def _counted(self, path: str):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def _counters(self, payload: Dict, started: float, first_token: float, tokens: int) -> Dict:
+        prompt = json.dumps(payload.get("messages") or payload.get("prompt"))
+        return {
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((time.monotonic() - started) * 1e9),
+            "load_duration": 0,
+            "prompt_eval_count": len(prompt) // 4,
+            "prompt_eval_duration": int((first_token - started) * 1e9),
+            "eval_count": tokens,
+            "eval_duration": max(1, int((time.monotonic() - first_token) * 1e9)),
+        }
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # Like Ollama; small NDJSON lines would otherwise wait for ACKs
+
+            def log_message(self, *args):
+                pass
+
+            def _json(self, body: Dict, status: int = 200):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _chunk(self, body: Dict):
+                line = json.dumps(body).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+
+            def do_GET(self):
+                fake._counted(self.path)
+                if self.path == "/api/tags":
+                    self._json({"models": [
+                        {"name": name, "model": name, "digest": hashlib.sha256(name.encode()).hexdigest(), "size": 0,
+                         "details": {"family": "fake", "parameter_size": "1B", "quantization_level": "Q4_0"}}
+                        for name in fake.models
+                    ]})
+                elif self.path == "/api/ps":
+                    self._json({"models": []})
+                else:
+                    self._json({"error": f"unknown endpoint {self.path}"}, 404)
+
+            def do_POST(self):
+                fake._counted(self.path)
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path == "/api/show":
+                    self._json({"model_info": {"general.architecture": "fake", "fake.context_length": fake.context_length}})
+                elif self.path == "/api/embed":
+                    texts = payload.get("input")
+                    texts = [texts] if isinstance(texts, str) else texts
+                    self._json({"model": payload.get("model"), "embeddings": [fake.embedding(text) for text in texts]})
+                elif self.path in ("/api/chat", "/api/generate"):
+                    self._generate(payload, chat=self.path == "/api/chat")
+                else:
+                    self._json({"error": f"unknown endpoint {self.path}"}, 404)
+
+            def _generate(self, payload: Dict, chat: bool):
+                started = time.monotonic()
+                model = payload.get("model")
+                tokens = fake.reply(payload) if payload.get("prompt", True) else []  # An empty prompt only loads
+                time.sleep(fake.latency)
+                first_token = time.monotonic()
+                delay = 1 / fake.token_rate if fake.token_rate else 0
+
+                def part(text: str) -> Dict:
+                    if chat:
+                        return {"model": model, "message": {"role": "assistant", "content": text}, "done": False}
+                    return {"model": model, "response": text, "done": False}
+
+                if not payload.get("stream", True):
+                    time.sleep(delay * len(tokens))
+                    self._json(dict(part("".join(tokens)), **fake._counters(payload, started, first_token, len(tokens))))
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for token in tokens:
+                        self._chunk(part(token))
+                        if delay:
+                            time.sleep(delay)
+                    self._chunk(dict(part(""), **fake._counters(payload, started, first_token, len(tokens))))
+                    self.wfile.write(b"0\r\n\r\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # The client stopped the generation
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a deterministic fake Ollama API.")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--token-rate", type=float, default=200.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--tokens", type=int, default=64)
+    args = parser.parse_args()
+    fake = FakeOllama(port=args.port, token_rate=args.token_rate, latency=args.latency, tokens=args.tokens).start()
+    print(f"Fake Ollama listening on {fake.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,111 @@
+"""
+Memory each in-memory chat message costs on top of its text.
+
+Run from the repository root:
+
+    python -m benchmarks.messageMemory --count 100000
+
+Messages are built the way Chat.from_dict builds them from chat store rows, once with the
+current Message and once with the layout it replaced (LegacyMessage below), and measured with
+tracemalloc after the rows are gone. The text itself is the same in both and is not counted.
+"""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+import argparse
+import random
+import json
+import sys
+import gc
+import tracemalloc
+
+from benchmarks.fakeOllama import WORDS
+
+
+@dataclass
+class LegacyMessage:
+    """The message layout before it was slotted: a __dict__ per message and a datetime object."""
+    role: object
+    content: str
+    name: Optional[str] = None
+    timestamp: datetime = field(default_factory=datetime.now)
+    id: Optional[int] = None
+    token_count: Optional[int] = field(default=None, repr=False, compare=False)
+    summary_of: Optional[int] = None
+
+
+def store_rows(count: int, seed: int = 0) -> str:
+    """Message rows as the chat store returns them, serialized so every load decodes fresh strings."""
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return json.dumps([
+        {
+            "id": i,
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 80))),
+            "name": "user" if i % 2 == 0 else "llama3.1:8b",
+            "timestamp": (start + timedelta(seconds=i)).isoformat(),
+            "summary_of": None,
+        }
+        for i in range(count)
+    ])
+
+
+def build_legacy(row: Dict, role) -> LegacyMessage:
+    return LegacyMessage(role=role(row["role"]), content=row["content"], name=row["name"],
+                         timestamp=datetime.fromisoformat(row["timestamp"]), id=row["id"], summary_of=row["summary_of"])
+
+
+def build_current(row: Dict, message_class, role) -> object:
+    return message_class(role=role(row["role"]), content=row["content"], name=row["name"],
+                         created_ms=round(datetime.fromisoformat(row["timestamp"]).timestamp() * 1000),
+                         id=row["id"], summary_of=row["summary_of"])
+
+
+def measure(rows_json: str, build: Callable[[Dict], object]) -> Dict:
+    gc.collect()
+    tracemalloc.start()
+    rows = json.loads(rows_json)
+    messages: List[object] = [build(row) for row in rows]
+    del rows
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    text = sum(sys.getsizeof(message.content) for message in messages)
+    overhead = retained - text - sys.getsizeof(messages)
+    return {
+        "messages": len(messages),
+        "retained_bytes": retained,
+        "text_bytes": text,
+        "overhead_bytes_per_message": round(overhead / len(messages), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory overhead of in-memory chat messages.")
+    parser.add_argument("--count", type=int, default=100000)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+
+    from llmFunctions import Message, MessageRole
+    rows_json = store_rows(args.count)
+    results = {
+        "legacy": measure(rows_json, lambda row: build_legacy(row, MessageRole)),
+        "current": measure(rows_json, lambda row: build_current(row, Message, MessageRole)),
+    }
+    results["saved_bytes_per_message"] = round(
+        results["legacy"]["overhead_bytes_per_message"] - results["current"]["overhead_bytes_per_message"], 1)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for name in ("legacy", "current"):
+        result = results[name]
+        print(f"{name:<8} {result['overhead_bytes_per_message']:>8.1f} bytes per message "
+              f"({result['retained_bytes'] / 1024 / 1024:.1f} MB for {result['messages']} messages, "
+              f"{result['text_bytes'] / 1024 / 1024:.1f} MB of it text)")
+    print(f"saved    {results['saved_bytes_per_message']:>8.1f} bytes per message")
+
+
+if __name__ == "__main__":
+    main()
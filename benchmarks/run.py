@@ -0,0 +1,380 @@
+"""
+End-to-end benchmarks of kosmos.chat against a fake Ollama server.
+
+Run from the repository root:
+
+    python -m benchmarks.run
+    python -m benchmarks.run --sizes 10,1000,100000 --requests 50 --token-rate 500
+    python -m benchmarks.run --compare benchmarks/results/<earlier run>.json
+
+Every corpus size runs in its own process with its own temporary home folder, so runs start
+from an empty chat database and the peak memory of one size does not hide another's.
+Results are written as JSON to benchmarks/results/ (see --output).
+"""
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+import argparse
+import datetime
+import platform
+import random
+import subprocess
+import json
+import sys
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from benchmarks.fakeOllama import FakeOllama, WORDS
+
+ROOT = Path(__file__).resolve().parent.parent
+MODEL_NAME = "fake:latest"
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Latency statistics in milliseconds from samples in seconds."""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 3)
+
+    return {
+        "avg": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50": pick(0.5),
+        "p95": pick(0.95),
+        "p99": pick(0.99),
+        "max": round(ordered[-1] * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Scenario:
+    """Times repeated calls of one operation and, optionally, the Python heap it needs at its peak."""
+
+    def __init__(self, name: str, trace_memory: bool = False, **details):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.details = details
+        self.samples: List[float] = []
+
+    def run(self, operation: Callable, repeat: int) -> Dict:
+        if self.trace_memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        for i in range(repeat):
+            begin = time.perf_counter()
+            operation(i)
+            self.samples.append(time.perf_counter() - begin)
+        elapsed = time.perf_counter() - started
+        result = {
+            "scenario": self.name,
+            **self.details,
+            "operations": repeat,
+            "seconds": round(elapsed, 4),
+            "operations_per_second": round(repeat / elapsed, 2) if elapsed else None,
+            "latency_ms": summarize(self.samples),
+        }
+        if self.trace_memory:
+            result["peak_traced_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+            tracemalloc.stop()
+        return result
+
+
+class PageSink:
+    """Stands in for the page: counts what Python sends over the Eel bridge."""
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        self.completed = 0
+        self.first_chunk: Optional[float] = None
+        self.finished = threading.Event()  # Set by generation_complete or generation_cancelled
+
+    def receive_chunk(self, text: str, chat_id: str):
+        if self.first_chunk is None:
+            self.first_chunk = time.perf_counter()
+        self.messages += 1
+        self.bytes += len(text)
+
+    def generation_complete(self, chat_id: str):
+        self.completed += 1
+        self.finished.set()
+
+    def generation_cancelled(self, chat_id: str):
+        self.finished.set()
+
+    def install(self, eel):
+        eel.receive_chunk = self.receive_chunk
+        eel.generation_complete = self.generation_complete
+        eel.generation_cancelled = self.generation_cancelled
+
+
+def _prepare_home(home: Path, ollama_url: str):
+    """Point the app's config folder (~/Documents/kosmos.chat) at a throwaway home folder."""
+    os.environ["HOME"] = os.environ["USERPROFILE"] = str(home)
+    folder = home / "Documents" / "kosmos.chat"
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / "config.json").write_text(json.dumps({
+        "ollama_url": ollama_url,
+        "semantic_search": False,   # Would need an embedding model
+        "response_cache": False,    # Every request should reach the server
+        "log_level": "WARNING",
+    }))
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def build_corpus(size: int, messages_per_chat: int, seed: int = 0) -> list:
+    """Deterministic chats with size messages in total, alternating user and assistant turns."""
+    from llmFunctions import Chat, Message, MessageRole
+    rng = random.Random(seed)
+    start = datetime.datetime(2024, 1, 1)
+    chats = []
+    for first in range(0, size, messages_per_chat):
+        count = min(messages_per_chat, size - first)
+        created = start + datetime.timedelta(minutes=first)
+        messages = [
+            Message(
+                role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+                content=_sentence(rng, rng.randint(5, 80)),
+                created_ms=round((created + datetime.timedelta(seconds=i)).timestamp() * 1000)
+            )
+            for i in range(count)
+        ]
+        chats.append(Chat(
+            id=f"bench-{first // messages_per_chat:06d}",
+            type="general",
+            title=_sentence(rng, 4),
+            created_at=created,
+            last_message_at=messages[-1].timestamp,
+            messages=messages,
+            model_name=MODEL_NAME
+        ))
+    return chats
+
+
+def run_generation(args) -> List[Dict]:
+    """Replies through Model.generate and through funcs.start_generating, which adds the bridge and the store."""
+    import eel
+    from functions import funcs, model, store
+
+    sink = PageSink()
+    sink.install(eel)
+    results = []
+
+    chat = model.create_chat("general", MODEL_NAME)
+    scenario = Scenario("model.generate", args.trace_memory, tokens_per_reply=args.tokens)
+    ttfts, chunks = [], []
+
+    def generate(i):
+        started = time.perf_counter()
+        count = 0
+        for _ in model.generate(f"Question {i}: {_sentence(random.Random(i), 20)}", chat_id=chat.id):
+            if count == 0:
+                ttfts.append(time.perf_counter() - started)
+            count += 1
+        chunks.append(count)
+
+    result = scenario.run(generate, args.requests)
+    result["ttft_ms"] = summarize(ttfts)
+    result["tokens_per_second"] = round(sum(chunks) / result["seconds"], 1)
+    results.append(result)
+
+    chat = model.create_chat("general", MODEL_NAME)
+    scenario = Scenario("funcs.start_generating", args.trace_memory, tokens_per_reply=args.tokens)
+    ttfts = []
+
+    def start_generating(i):
+        started = time.perf_counter()
+        sink.first_chunk = None
+        sink.finished.clear()
+        # Returns once the reply started, the page hears about the end through generation_complete
+        funcs.start_generating(f"Question {i}: {_sentence(random.Random(i), 20)}", chat.id)
+        sink.finished.wait()
+        if sink.first_chunk is not None:
+            ttfts.append(sink.first_chunk - started)
+
+    result = scenario.run(start_generating, args.requests)
+    result["ttft_ms"] = summarize(ttfts)  # Until the first batch of text reaches the page
+    result["bridge_messages_per_reply"] = round(sink.messages / max(1, sink.completed), 1)
+    results.append(result)
+    store.flush()
+    return results
+
+
+def run_corpus(args, size: int) -> List[Dict]:
+    """Writing, indexing, listing, opening and searching a corpus of size messages."""
+    import functions
+    from functions import funcs, model, store
+
+    results = []
+    chats = build_corpus(size, args.messages_per_chat)
+
+    def write_corpus(i):
+        for chat in chats:
+            store.add_chat(chat)
+        store.flush()
+
+    result = Scenario("store.add_chat", args.trace_memory, size=size, chats=len(chats)).run(write_corpus, 1)
+    result["messages_per_second"] = round(size / result["seconds"], 1)
+    results.append(result)
+
+    for chat in chats[-model.max_loaded_chats:]:
+        model._remember(chat)
+
+    def save_chats(i):
+        functions._save_chats()
+        store.flush()
+
+    results.append(Scenario("_save_chats", args.trace_memory, size=size, loaded_chats=len(model.chats)).run(save_chats, args.repeat))
+    results.append(Scenario("_load_chats", args.trace_memory, size=size).run(lambda i: functions._load_chats(), args.repeat))
+    functions.chats_ready.set()
+    results.append(Scenario("funcs.get_chats", args.trace_memory, size=size).run(lambda i: funcs.get_chats(), args.repeat))
+
+    rng = random.Random(size)
+    model.chats.clear()  # Opening a chat that is not loaded reads its messages from the store
+    results.append(Scenario("funcs.get_chat", args.trace_memory, size=size).run(
+        lambda i: funcs.get_chat(rng.choice(chats).id), args.repeat))
+
+    queries = [rng.choice(WORDS) + " " + rng.choice(WORDS) for _ in range(args.repeat)]
+    scenario = Scenario("funcs.search_chats", args.trace_memory, size=size)
+    hits = []
+    results.append(scenario.run(lambda i: hits.append(len(funcs.search_chats(queries[i]))), args.repeat))
+    results[-1]["average_hits"] = round(sum(hits) / len(hits), 1)
+    return results
+
+
+def worker(args):
+    """Runs in the child process: one group of scenarios against a fresh app."""
+    _prepare_home(Path(args.home), args.ollama_url)
+    if args.worker == "generation":
+        results = run_generation(args)
+    else:
+        results = run_corpus(args, args.size)
+    from metrics import metrics
+    from functions import model, store
+    output = {"results": results, "peak_rss_mb": peak_rss_mb(), "metrics": metrics.snapshot()}
+    model.jobs.shutdown()
+    store.close()
+    Path(args.result_file).write_text(json.dumps(output))
+
+
+def _spawn(args, kind: str, url: str, size: Optional[int] = None) -> Dict:
+    with tempfile.TemporaryDirectory(prefix="kosmos-bench-") as home:
+        result_file = Path(home) / "result.json"
+        command = [
+            sys.executable, "-m", "benchmarks.run", "--worker", kind,
+            "--home", home, "--ollama-url", url, "--result-file", str(result_file),
+            "--requests", str(args.requests), "--repeat", str(args.repeat),
+            "--messages-per-chat", str(args.messages_per_chat), "--tokens", str(args.tokens),
+        ]
+        if size is not None:
+            command += ["--size", str(size)]
+        if args.trace_memory:
+            command.append("--trace-memory")
+        subprocess.run(command, cwd=ROOT, check=True)
+        output = json.loads(result_file.read_text())
+    for result in output["results"]:
+        result["process_peak_rss_mb"] = output["peak_rss_mb"]
+    return output
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _key(result: Dict) -> tuple:
+    return result["scenario"], result.get("size")
+
+
+def compare(current: Dict, previous_file: Path):
+    previous = {_key(result): result for result in json.loads(previous_file.read_text())["results"]}
+    print(f"\nCompared with {previous_file.name} (p50 latency, lower is better):")
+    for result in current["results"]:
+        before = previous.get(_key(result))
+        if not before or not before["latency_ms"] or not result["latency_ms"]:
+            continue
+        old, new = before["latency_ms"]["p50"], result["latency_ms"]["p50"]
+        change = (new - old) / old * 100 if old else 0.0
+        print(f"  {result['scenario']:<24} {str(result.get('size') or ''):>7}  {old:>10.3f} -> {new:>10.3f} ms  {change:+6.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark kosmos.chat against a fake Ollama server.")
+    parser.add_argument("--sizes", default="10,1000,10000,100000", help="Corpus sizes in messages, comma separated.")
+    parser.add_argument("--requests", type=int, default=20, help="Replies generated per generation scenario.")
+    parser.add_argument("--repeat", type=int, default=50, help="Calls per corpus scenario.")
+    parser.add_argument("--messages-per-chat", type=int, default=50)
+    parser.add_argument("--tokens", type=int, default=64, help="Tokens per fake reply.")
+    parser.add_argument("--token-rate", type=float, default=200.0, help="Fake tokens per second, 0 for unthrottled.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake seconds before the first token.")
+    parser.add_argument("--trace-memory", action="store_true", help="Record each scenario's peak Python heap (slower).")
+    parser.add_argument("--output", default=str(ROOT / "benchmarks" / "results"), help="Folder for the JSON results.")
+    parser.add_argument("--compare", help="An earlier results file to compare against.")
+    # Used by the child processes
+    parser.add_argument("--worker", choices=("generation", "corpus"), help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--home", help=argparse.SUPPRESS)
+    parser.add_argument("--ollama-url", help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    fake = FakeOllama(token_rate=args.token_rate, latency=args.latency, tokens=args.tokens, models=[MODEL_NAME]).start()
+    report = {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {name: getattr(args, name) for name in ("requests", "repeat", "messages_per_chat", "tokens", "token_rate", "latency")},
+        "results": [],
+        "metrics": {},
+    }
+    try:
+        runs = [("generation", None)] + [("corpus", int(size)) for size in args.sizes.split(",") if size]
+        for kind, size in runs:
+            print(f"Running {kind}" + (f" with {size} messages" if size else "") + "...", flush=True)
+            output = _spawn(args, kind, fake.url, size)
+            report["results"] += output["results"]
+            report["metrics"][f"{kind}-{size}" if size else kind] = output["metrics"]
+    finally:
+        fake.stop()
+
+    print(f"\n{'scenario':<24} {'size':>7} {'ops/s':>10} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'rss MB':>8}")
+    for result in report["results"]:
+        latency = result["latency_ms"]
+        print(f"{result['scenario']:<24} {str(result.get('size') or ''):>7} {result['operations_per_second'] or 0:>10.1f} "
+              f"{latency.get('p50', 0):>10.3f} {latency.get('p95', 0):>10.3f} {latency.get('p99', 0):>10.3f} "
+              f"{result['process_peak_rss_mb'] or 0:>8.1f}")
+
+    output_folder = Path(args.output)
+    output_folder.mkdir(parents=True, exist_ok=True)
+    output_file = output_folder / f"{report['started_at'].replace(':', '-')}.json"
+    output_file.write_text(json.dumps(report, indent=2))
+    print(f"\nSaved results to {output_file}")
+    if args.compare:
+        compare(report, Path(args.compare))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Callable, List, Dict, Optional
+import logging
+
+
+class ContextStrategy(Enum):
+    SLIDING_WINDOW = "sliding_window"  # Newest messages only
+    PINNED_SYSTEM = "pinned_system"    # System prompt(s) plus the newest turns
+    KEEP_FIRST = "keep_first"          # The first N messages plus the newest turns
+
+
+@dataclass
+class ContextWindow:
+    """The messages selected for one request and what was left out."""
+    messages: List[Dict] = field(default_factory=list)
+    tokens: int = 0
+    budget: int = 0
+    dropped_messages: int = 0
+    dropped_tokens: int = 0
+
+
+class ContextBuilder:
+    """Fits a chat's history into a per-model token budget."""
+
+    # Rough cost of the role and separators Ollama's chat templates wrap around every message
+    MESSAGE_OVERHEAD = 4
+
+    def __init__(self, default_budget: int = 4096, budgets: Optional[Dict[str, int]] = None,
+                 strategy: str = ContextStrategy.PINNED_SYSTEM.value, keep_first: int = 2,
+                 reserve_tokens: int = 512, low_watermark: float = 0.75,
+                 max_context_size: Optional[Callable[[str], Optional[int]]] = None):
+        """
+        :param default_budget: Context size in tokens for models without an entry in budgets.
+        :param budgets: Context size in tokens per model name.
+        :param strategy: The default ContextStrategy value.
+        :param keep_first: How many leading messages KEEP_FIRST pins.
+        :param reserve_tokens: Tokens kept free for the model's reply.
+        :param low_watermark: When history has to be cut, it is cut down to this fraction of the budget,
+                              so the following turns can reuse the same prefix (and Ollama's KV cache).
+        :param max_context_size: Callable returning the longest context a model supports, or None if unknown.
+                                 Budgets larger than that are capped to it.
+        """
+        self.default_budget = default_budget
+        self.budgets = budgets or {}
+        self.strategy = ContextStrategy(strategy)
+        self.keep_first = keep_first
+        self.reserve_tokens = reserve_tokens
+        self.low_watermark = low_watermark
+        self.max_context_size = max_context_size
+        self._window_starts: Dict[str, int] = {}  # Per chat: id of the first message sent after the pinned ones
+
+    @staticmethod
+    def estimate_tokens(text: str) -> int:
+        """Approximate token count, about four characters per token for English text and code."""
+        return (len(text) + 3) // 4
+
+    def count_tokens(self, message) -> int:
+        """Token cost of a message, computed once and cached on the message."""
+        if message.token_count is None:
+            message.token_count = self.estimate_tokens(message.content) + self.MESSAGE_OVERHEAD
+        return message.token_count
+
+    def context_size(self, model_name: str) -> int:
+        """The model's full context size in tokens, prompt and reply together."""
+        size = self.budgets.get(model_name, self.default_budget)
+        limit = self.max_context_size(model_name) if self.max_context_size else None
+        return min(size, limit) if limit else size
+
+    def budget_for(self, model_name: str) -> int:
+        return max(0, self.context_size(model_name) - self.reserve_tokens)
+
+    @staticmethod
+    def _to_dict(message) -> Dict:
+        message_dict = {"role": message.role.value, "content": message.content}
+        if message.name:
+            message_dict["name"] = message.name
+        return message_dict
+
+    def _pinned_count(self, messages: list, strategy: ContextStrategy) -> int:
+        if strategy == ContextStrategy.KEEP_FIRST:
+            return min(self.keep_first, len(messages))
+        if strategy == ContextStrategy.PINNED_SYSTEM:
+            count = 0
+            while count < len(messages) and messages[count].role.value == "system":
+                count += 1
+            return count
+        return 0
+
+    def _cut(self, messages: list, pinned: int, used: int, limit: int) -> int:
+        """Walk back from the newest message while the messages fit in limit, return the first index kept."""
+        start = len(messages)
+        while start > pinned:
+            cost = self.count_tokens(messages[start - 1])
+            if used + cost > limit and start < len(messages):
+                break
+            used += cost
+            start -= 1
+        return start
+
+    def build(self, messages: list, model_name: str, system_prompt: Optional[str] = None,
+              strategy: Optional[str] = None, key: Optional[str] = None) -> ContextWindow:
+        """
+        Select the messages to send for the next request.
+
+        :param messages: The chat history, oldest first. The last message is always kept.
+        :param model_name: The model the request goes to, selects the budget.
+        :param system_prompt: An extra system prompt sent before the history, always kept.
+        :param strategy: A ContextStrategy value overriding the default.
+        :param key: Identifies the conversation (e.g. the chat id) so the cut point stays put between turns.
+        :return: The selected messages as Ollama message dicts, with token accounting.
+        """
+        strategy = ContextStrategy(strategy) if strategy else self.strategy
+        budget = self.budget_for(model_name)
+        window = ContextWindow(budget=budget)
+        if system_prompt:
+            window.tokens += self.estimate_tokens(system_prompt) + self.MESSAGE_OVERHEAD
+
+        pinned = self._pinned_count(messages, strategy) if len(messages) > 1 else 0
+        window.tokens += sum(self.count_tokens(message) for message in messages[:pinned])
+
+        # Keep the previous cut point while everything after it still fits, so the prompt keeps its prefix
+        start = None
+        sticky = self._window_starts.get(key) if key is not None else None
+        if sticky is not None:
+            index = next((i for i in range(pinned, len(messages)) if messages[i].id == sticky), None)
+            if index is not None and self._cut(messages, index, window.tokens, budget) == index:
+                start = index
+        if start is None:
+            start = self._cut(messages, pinned, window.tokens, budget)
+            if start > pinned:
+                # Cutting anyway, so cut deeper to leave room for the next turns
+                start = self._cut(messages, pinned, window.tokens, int(budget * self.low_watermark))
+        if key is not None and start < len(messages):
+            self._window_starts[key] = messages[start].id
+        window.tokens += sum(self.count_tokens(message) for message in messages[start:])
+
+        dropped = messages[pinned:start]
+        window.dropped_messages = len(dropped)
+        window.dropped_tokens = sum(self.count_tokens(message) for message in dropped)
+
+        if system_prompt:
+            window.messages.append({"role": "system", "content": system_prompt})
+        window.messages.extend(self._to_dict(message) for message in messages[:pinned])
+        window.messages.extend(self._to_dict(message) for message in messages[start:])
+        if window.dropped_messages:
+            logging.info(
+                f"Context for {model_name}: dropped {window.dropped_messages} messages "
+                f"({window.dropped_tokens} tokens) to fit {window.tokens}/{budget} tokens"
+            )
+        return window
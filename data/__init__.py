@@ -3,15 +3,42 @@ from pathlib import Path
 import os
 import traceback
 import logging
+import threading
+from .chatStore import ChatStore as ChatStore
+from .vectorIndex import VectorIndex as VectorIndex
+from .responseCache import ResponseCache as ResponseCache
 
 class Config:
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, folder_name: str = "MyConfig", file_name: str = "config.json", load_on_get: bool = False) -> "Config":
+        """
+        Return the process-wide configuration for the given folder and file, creating it on first use.
+        
+        :param folder_name: The name of the folder inside the user's Documents directory.
+        :param file_name: The name of the configuration file.
+        :param load_on_get: Whether get() should pick up changes made to the file by someone else.
+        """
+        with cls._instances_lock:
+            key = (folder_name, file_name)
+            config = cls._instances.get(key)
+            if config is None:
+                config = cls._instances[key] = cls(folder_name, file_name, load_on_get)
+            elif load_on_get:
+                config.load_on_get = True
+            return config
+
     def __init__(self, folder_name: str = "MyConfig", file_name: str = "config.json", load_on_get: bool = False):
         """
         Initialize the configuration.
         
         :param folder_name: The name of the folder inside the user's Documents directory.
         :param file_name: The name of the configuration file.
+        :param load_on_get: Reload before get() when the file changed on disk since it was last read.
         """
+        self._stamp = None
         try:
             # Determine the user's Documents folder (works on most platforms)
             self.documents_path = Path.home() / "Documents"
@@ -36,11 +63,21 @@ class Config:
             self.data = {}
             self.save()
 
+    def _file_stamp(self):
+        """Return the (mtime, size) of the config file, or None if it does not exist."""
+        try:
+            stat = self.config_file.stat()
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
     def save(self):
         """Save the current configuration to the JSON file."""
         try:
             with self.config_file.open("w", encoding="utf-8") as f:
                 json.dump(self.data, f, indent=4)
+            # Our own write must not look like an outside change
+            self._stamp = self._file_stamp()
         except Exception as e:
             print(f"Error saving config: {str(e)}")
             traceback.print_exc()
@@ -48,11 +85,13 @@ class Config:
     def load(self):
         """Load the configuration from the JSON file."""
         try:
-            if self.config_file.exists():
+            stamp = self._file_stamp()
+            if stamp is not None:
                 with self.config_file.open("r", encoding="utf-8") as f:
                     self.data = json.load(f)
             else:
                 self.data = {}
+            self._stamp = stamp
         except Exception as e:
             print(f"Error loading config: {str(e)}")
             traceback.print_exc()
@@ -68,7 +107,7 @@ class Config:
         :return: The value associated with the key, or the default.
         """
         try:
-            if self.load_on_get:
+            if self.load_on_get and self._file_stamp() != self._stamp:
                 self.load()
             return self.data.get(key, default)
         except Exception as e:
@@ -0,0 +1,572 @@
+import sqlite3
+import threading
+import logging
+import html
+import re
+import time
+from collections import deque
+from pathlib import Path
+
+
+class ChatStore:
+    """
+    SQLite backed storage for chats and their messages.
+
+    Writes are group committed: they are queued, and a writer thread commits them once no new
+    write arrived for batch_interval (at most max_batch_delay after the first one), in one
+    transaction with one fsync of the write-ahead log. A crash loses at most the last batch.
+    Chat metadata is only marked dirty and written once per batch however often it changed. Message ids are handed out when a write is queued, and every read
+    commits the queued writes first, so callers never see the delay. The WAL is the journal,
+    SQLite replays it on open, and it is checkpointed into the database file in the background.
+    """
+
+    def __init__(self, folder: Path, file_name: str = "chats.db", batch_interval: float = 0.05,
+                 max_batch_delay: float = 1.0, checkpoint_interval: float = 300, on_flush=None):
+        """
+        Open (or create) the chat database.
+
+        :param folder: The folder the database file lives in, usually the config folder.
+        :param file_name: The name of the database file.
+        :param batch_interval: Seconds without writes before they are committed, 0 commits every write at once.
+        :param max_batch_delay: Seconds a write waits at most during a steady stream of writes.
+        :param checkpoint_interval: Seconds between folding the WAL back into the database file.
+        :param on_flush: Called with the seconds and row bytes of every committed batch, e.g. to record metrics.
+        """
+        self.db_file = Path(folder) / file_name
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.batch_interval = batch_interval
+        self.max_batch_delay = max(batch_interval, max_batch_delay)
+        self.checkpoint_interval = checkpoint_interval
+        # WAL keeps writers from blocking readers and turns every insert into a small append.
+        # Batched commits are few enough to fsync each one.
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(f"PRAGMA synchronous={'FULL' if batch_interval > 0 else 'NORMAL'}")
+        self.connection.execute("PRAGMA foreign_keys=ON")
+        self._create_tables()
+        self.fts = self._create_search_index()
+        self.pending = []  # Queued writes, callables run inside the batch transaction
+        self.pending_bytes = 0
+        self.dirty = {}  # Chat id -> chat whose metadata is written with the next batch
+        self.pending_condition = threading.Condition()
+        self.first_queued = self.last_queued = 0.0
+        self.batches = 0
+        self.bytes_written = 0
+        self.flush_times = deque(maxlen=200)  # Seconds per committed batch
+        self.last_flush_bytes = 0
+        self.last_checkpoint = time.monotonic()
+        self.on_flush = on_flush
+        self._closed = False
+        # Never below an id that was handed out before, its vector may still be in the embedding index
+        self._next_message_id = self.connection.execute(
+            """
+            SELECT MAX(COALESCE((SELECT MAX(id) FROM messages), 0),
+                       COALESCE((SELECT value FROM store_meta WHERE key = 'last_message_id'), 0))
+            """
+        ).fetchone()[0] + 1
+        self.writer = None
+        if batch_interval > 0:
+            self.writer = threading.Thread(target=self._write_loop, daemon=True, name="chat-store-writer")
+            self.writer.start()
+
+    def _create_tables(self):
+        with self.lock, self.connection:
+            self.connection.executescript("""
+                CREATE TABLE IF NOT EXISTS chats (
+                    id TEXT PRIMARY KEY,
+                    type TEXT NOT NULL,
+                    title TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    last_message_at TEXT NOT NULL,
+                    system_prompt TEXT,
+                    model_name TEXT NOT NULL,
+                    message_count INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY,
+                    chat_id TEXT NOT NULL REFERENCES chats(id) ON DELETE CASCADE,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    name TEXT,
+                    timestamp TEXT NOT NULL,
+                    summary_of INTEGER
+                );
+                CREATE INDEX IF NOT EXISTS idx_messages_chat ON messages(chat_id, id);
+                CREATE TABLE IF NOT EXISTS store_meta (
+                    key TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """)
+            columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(chats)")}
+            if "message_count" not in columns:
+                # Databases created before the summary index existed
+                self.connection.execute("ALTER TABLE chats ADD COLUMN message_count INTEGER NOT NULL DEFAULT 0")
+                self.connection.execute(
+                    "UPDATE chats SET message_count = (SELECT COUNT(*) FROM messages WHERE messages.chat_id = chats.id)"
+                )
+            columns = {row["name"] for row in self.connection.execute("PRAGMA table_info(messages)")}
+            if "summary_of" not in columns:
+                # Databases created before history compaction existed
+                self.connection.execute("ALTER TABLE messages ADD COLUMN summary_of INTEGER")
+
+    def _create_search_index(self) -> bool:
+        """
+        Create the FTS5 indexes over chat titles and message contents, kept in sync by triggers.
+
+        :return: False if this SQLite build has no FTS5, in which case search falls back to LIKE scans.
+        """
+        try:
+            with self.lock, self.connection:
+                exists = self.connection.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'messages_fts'"
+                ).fetchone()
+                self.connection.executescript("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+                        content, content='messages', content_rowid='id',
+                        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                    );
+                    CREATE VIRTUAL TABLE IF NOT EXISTS chats_fts USING fts5(
+                        title, content='chats', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2'
+                    );
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+                        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+                        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+                        INSERT INTO messages_fts(messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+                        INSERT INTO messages_fts(rowid, content) VALUES (new.id, new.content);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS chats_fts_insert AFTER INSERT ON chats BEGIN
+                        INSERT INTO chats_fts(rowid, title) VALUES (new.rowid, new.title);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS chats_fts_delete AFTER DELETE ON chats BEGIN
+                        INSERT INTO chats_fts(chats_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS chats_fts_update AFTER UPDATE OF title ON chats BEGIN
+                        INSERT INTO chats_fts(chats_fts, rowid, title) VALUES ('delete', old.rowid, old.title);
+                        INSERT INTO chats_fts(rowid, title) VALUES (new.rowid, new.title);
+                    END;
+                """)
+                if not exists:
+                    # Index whatever was stored before the search index existed
+                    self.connection.execute("INSERT INTO messages_fts(messages_fts) VALUES ('rebuild')")
+                    self.connection.execute("INSERT INTO chats_fts(chats_fts) VALUES ('rebuild')")
+            return True
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Full-text search unavailable, falling back to LIKE search: {e}")
+            return False
+
+    @staticmethod
+    def _chat_row(chat) -> tuple:
+        return (
+            chat.id,
+            chat.type,
+            chat.title,
+            chat.created_at.isoformat(),
+            chat.last_message_at.isoformat(),
+            chat.system_prompt,
+            chat.model_name,
+        )
+
+    def _upsert_chat(self, row: tuple):
+        self.connection.execute(
+            """
+            INSERT INTO chats (id, type, title, created_at, last_message_at, system_prompt, model_name)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                type = excluded.type,
+                title = excluded.title,
+                last_message_at = excluded.last_message_at,
+                system_prompt = excluded.system_prompt,
+                model_name = excluded.model_name
+            """,
+            row,
+        )
+
+    def _update_chat(self, row: tuple):
+        """Write a chat's metadata; a chat that was deleted in the meantime stays deleted."""
+        chat_id, chat_type, title, _, last_message_at, system_prompt, model_name = row
+        self.connection.execute(
+            """
+            UPDATE chats SET type = ?, title = ?, last_message_at = ?, system_prompt = ?, model_name = ?
+            WHERE id = ?
+            """,
+            (chat_type, title, last_message_at, system_prompt, model_name, chat_id),
+        )
+
+    @staticmethod
+    def _row_bytes(row: tuple) -> int:
+        return sum(len(value.encode("utf-8")) if isinstance(value, str) else 8 for value in row if value is not None)
+
+    def _message_row(self, chat_id: str, message) -> tuple:
+        """Give the message its id and capture its columns as they are now."""
+        with self.pending_condition:
+            message.id = self._next_message_id
+            self._next_message_id += 1
+        return (message.id, chat_id, message.role.value, message.content, message.name,
+                message.timestamp.isoformat(), message.summary_of)
+
+    def _insert_message(self, row: tuple):
+        self.connection.execute(
+            "INSERT INTO messages (id, chat_id, role, content, name, timestamp, summary_of) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            row,
+        )
+        self.connection.execute("UPDATE chats SET message_count = message_count + 1 WHERE id = ?", (row[1],))
+
+    def _queue(self, write, size: int = 0, chat=None):
+        """
+        Run write (a callable using self.connection) in the next batch, or right away when not batching.
+
+        :param size: Bytes of row data the write stores, for stats().
+        :param chat: A chat whose metadata is written after the batch's writes, if its row still exists.
+        """
+        if self.writer is None:
+            with self.lock, self.connection:
+                if write is not None:
+                    write()
+                if chat is not None:
+                    self._update_chat(self._chat_row(chat))
+            return
+        with self.pending_condition:
+            now = time.monotonic()
+            if not self.pending and not self.dirty:
+                self.first_queued = now
+            self.last_queued = now
+            if chat is not None:
+                self.dirty[chat.id] = chat
+            if write is not None:
+                self.pending.append(write)
+                self.pending_bytes += size
+            self.pending_condition.notify()
+
+    def _commit_pending(self):
+        with self.lock:
+            with self.pending_condition:
+                writes, self.pending = self.pending, []
+                chats, self.dirty = list(self.dirty.values()), {}
+                size, self.pending_bytes = self.pending_bytes, 0
+            if not writes and not chats:
+                return
+            started = time.perf_counter()
+            with self.connection:
+                self.connection.execute("BEGIN")
+                for write in writes:
+                    # A failing write must not take the rest of the batch down with it
+                    self.connection.execute("SAVEPOINT write")
+                    try:
+                        write()
+                    except Exception as e:
+                        self.connection.execute("ROLLBACK TO write")
+                        logging.error(f"Chat store write failed: {e}", exc_info=True)
+                    self.connection.execute("RELEASE write")
+                # After the writes, which insert the rows of new chats
+                for chat in chats:
+                    row = self._chat_row(chat)
+                    self._update_chat(row)
+                    size += self._row_bytes(row)
+            duration = time.perf_counter() - started
+            self.flush_times.append(duration)
+            self.batches += 1
+            self.bytes_written += size
+            self.last_flush_bytes = size
+        if self.on_flush is not None:
+            self.on_flush(duration, size)
+
+    def flush(self):
+        """Commit every queued write now."""
+        try:
+            self._commit_pending()
+        except sqlite3.Error as e:
+            logging.error(f"Committing chat store writes failed: {e}", exc_info=True)
+
+    def stats(self) -> dict:
+        """Batch commit statistics: latency in milliseconds and row bytes written."""
+        with self.pending_condition:
+            times = sorted(self.flush_times)
+            return {
+                "batches": self.batches,
+                "pending_writes": len(self.pending),
+                "dirty_chats": len(self.dirty),
+                "bytes_written": self.bytes_written,
+                "last_flush_bytes": self.last_flush_bytes,
+                "last_flush_ms": round(self.flush_times[-1] * 1000, 2) if times else None,
+                "avg_flush_ms": round(sum(times) / len(times) * 1000, 2) if times else None,
+                "p95_flush_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))] * 1000, 2) if times else None,
+            }
+
+    def checkpoint(self):
+        """Fold the WAL back into the database file and truncate it."""
+        with self.lock:
+            self._commit_pending()
+            self.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self.last_checkpoint = time.monotonic()
+
+    def _write_loop(self):
+        while True:
+            with self.pending_condition:
+                if not self.pending and not self.dirty and not self._closed:
+                    self.pending_condition.wait(timeout=self.checkpoint_interval)
+                if self._closed:
+                    return
+                has_writes = bool(self.pending or self.dirty)
+            try:
+                if has_writes:
+                    # Debounce: wait for a quiet batch_interval, but not past max_batch_delay
+                    while True:
+                        with self.pending_condition:
+                            now = time.monotonic()
+                            wait = min(self.last_queued + self.batch_interval, self.first_queued + self.max_batch_delay) - now
+                        if wait <= 0:
+                            break
+                        time.sleep(wait)
+                    self._commit_pending()
+                if time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+                    self.checkpoint()
+            except sqlite3.Error as e:
+                logging.error(f"Chat store writer failed: {e}", exc_info=True)
+
+    def save_chat(self, chat):
+        """Persist the metadata (title, timestamps, model) of a stored chat without touching its messages."""
+        self._queue(None, chat=chat)
+
+    def add_chat(self, chat):
+        """Persist a chat together with all of its messages."""
+        row = self._chat_row(chat)
+        messages = [self._message_row(chat.id, message) for message in chat.messages]
+
+        def write():
+            self._upsert_chat(row)
+            for message in messages:
+                self._insert_message(message)
+        self._queue(write, self._row_bytes(row) + sum(self._row_bytes(message) for message in messages))
+
+    def add_message(self, chat, message) -> int:
+        """
+        Append a single message and update the chat's metadata in one transaction.
+
+        :param chat: The chat the message belongs to.
+        :param message: The message to insert, its ``id`` is set right away.
+        :return: The id of the message.
+        """
+        message_row = self._message_row(chat.id, message)
+        self._queue(lambda: self._insert_message(message_row), self._row_bytes(message_row), chat=chat)
+        return message.id
+
+    def _keep_last_message_id(self):
+        """Remember the highest message id before deleting messages, so no id is handed out twice."""
+        self.connection.execute(
+            """
+            INSERT INTO store_meta (key, value) SELECT 'last_message_id', COALESCE(MAX(id), 0) FROM messages WHERE true
+            ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)
+            """
+        )
+
+    def delete_message(self, message_id: int):
+        def write():
+            self._keep_last_message_id()
+            self.connection.execute(
+                "UPDATE chats SET message_count = message_count - 1 WHERE id = (SELECT chat_id FROM messages WHERE id = ?)",
+                (message_id,),
+            )
+            self.connection.execute("DELETE FROM messages WHERE id = ?", (message_id,))
+        self._queue(write)
+
+    def delete_chat(self, chat_id: str):
+        with self.pending_condition:
+            self.dirty.pop(chat_id, None)  # Would bring the row back
+
+        def write():
+            self._keep_last_message_id()
+            self.connection.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+        self._queue(write)
+
+    def message_ids(self, chat_id: str) -> list:
+        """The ids of a chat's stored messages."""
+        self.flush()
+        with self.lock:
+            return [row["id"] for row in self.connection.execute("SELECT id FROM messages WHERE chat_id = ?", (chat_id,))]
+
+    def messages_after(self, message_id: int, limit: int = 100) -> list:
+        """Return up to limit non-system messages with an id above message_id, oldest first."""
+        self.flush()
+        with self.lock:
+            return [
+                dict(row)
+                for row in self.connection.execute(
+                    "SELECT id, chat_id, content FROM messages WHERE id > ? AND role != 'system' ORDER BY id LIMIT ?",
+                    (message_id, limit),
+                )
+            ]
+
+    def get_messages(self, message_ids: list) -> dict:
+        """Return {message_id: row} for the given ids; ids of deleted messages are left out."""
+        if not message_ids:
+            return {}
+        self.flush()
+        placeholders = ", ".join("?" for _ in message_ids)
+        with self.lock:
+            return {
+                row["id"]: dict(row)
+                for row in self.connection.execute(
+                    f"SELECT id, chat_id, content FROM messages WHERE id IN ({placeholders})", list(message_ids)
+                )
+            }
+
+    def chat_ids(self) -> set:
+        self.flush()
+        with self.lock:
+            return {row["id"] for row in self.connection.execute("SELECT id FROM chats")}
+
+    def load_summaries(self) -> list:
+        """
+        Load the summary of every chat without reading any message bodies.
+
+        :return: A list of dicts with id, title, type, created_at, last_message_at and message_count.
+        """
+        self.flush()
+        with self.lock:
+            return [
+                dict(row)
+                for row in self.connection.execute(
+                    "SELECT id, title, type, created_at, last_message_at, message_count FROM chats"
+                )
+            ]
+
+    def load_chat(self, chat_id: str):
+        """
+        Load a single chat with its messages.
+
+        :param chat_id: The id of the chat to load.
+        :return: A chat dict with a "messages" list, or None if the chat does not exist.
+        """
+        self.flush()
+        with self.lock:
+            row = self.connection.execute("SELECT * FROM chats WHERE id = ?", (chat_id,)).fetchone()
+            if row is None:
+                return None
+            messages = self.connection.execute(
+                "SELECT * FROM messages WHERE chat_id = ? ORDER BY id", (chat_id,)
+            ).fetchall()
+        return {**dict(row), "messages": [dict(message) for message in messages]}
+
+    @staticmethod
+    def _fts_query(tokens: list, min_prefix: int = 2) -> str:
+        """
+        Match every finished word exactly and the last, still being typed, word as a prefix.
+
+        :param min_prefix: A single letter is matched exactly, as a prefix it matches nearly everything. Kept in step with the prefix='2 3' index.
+        """
+        words = [f'"{token}"' for token in tokens]
+        if len(tokens[-1]) >= min_prefix:
+            words[-1] += "*"
+        return " ".join(words)
+
+    @staticmethod
+    def _snippet(content: str, tokens: list, width: int = 80) -> str:
+        """Cut an HTML excerpt around the first match with every match wrapped in <mark>."""
+        pattern = re.compile(r"\b(?:" + "|".join(re.escape(token) for token in tokens) + r")\w*", re.IGNORECASE)
+        first = pattern.search(content)
+        start = max(0, first.start() - width // 2) if first else 0
+        end = min(len(content), start + width)
+        excerpt = content[start:end]
+        parts, last = [], 0
+        for match in pattern.finditer(excerpt):
+            parts.append(html.escape(excerpt[last:match.start()]))
+            parts.append(f"<mark>{html.escape(match.group())}</mark>")
+            last = match.end()
+        parts.append(html.escape(excerpt[last:]))
+        return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(content) else "")
+
+    def search(self, query: str, limit: int = 50, candidates: int = 500) -> list:
+        """
+        Search chat titles and message contents, ranked by bm25.
+
+        :param query: Free text; the last word is matched as a prefix once it has two letters.
+        :param limit: The maximum number of chats to return.
+        :param candidates: When at least this many messages match, they are ordered newest first instead of by bm25.
+        :return: A list of (chat_id, snippet) tuples, best match first. The snippet is HTML with the
+                 matches wrapped in <mark>, or None when only the title matched.
+        """
+        self.flush()
+        if not self.fts:
+            return [(chat_id, None) for chat_id in self._search_like(query)][:limit]
+        tokens = re.findall(r"\w+", query)
+        if not tokens:
+            return []
+        match = self._fts_query(tokens)
+        results = {}
+        with self.lock:
+            # Title hits rank above message hits
+            for row in self.connection.execute(
+                """
+                SELECT chats.id FROM chats_fts JOIN chats ON chats.rowid = chats_fts.rowid
+                WHERE chats_fts MATCH ? ORDER BY rank LIMIT ?
+                """,
+                (match, limit),
+            ):
+                results[row["id"]] = None
+            newest = [
+                row[0]
+                for row in self.connection.execute(
+                    "SELECT rowid FROM messages_fts WHERE messages_fts MATCH ? ORDER BY rowid DESC LIMIT ?",
+                    (match, candidates),
+                )
+            ]
+            if len(newest) < candidates:
+                # Messages are ranked individually; the best message of each chat supplies its snippet
+                rows = self.connection.execute(
+                    """
+                    SELECT messages.chat_id, messages.content
+                    FROM messages_fts JOIN messages ON messages.id = messages_fts.rowid
+                    WHERE messages_fts MATCH ? ORDER BY rank LIMIT ?
+                    """,
+                    (match, limit * 4),
+                ).fetchall()
+            else:
+                # Words this common barely tell messages apart under bm25, and its document frequencies
+                # alone cost a pass over every match, so the newest matches come first instead
+                placeholders = ", ".join("?" for _ in newest)
+                rows = self.connection.execute(
+                    f"SELECT chat_id, content FROM messages WHERE id IN ({placeholders}) ORDER BY id DESC", newest
+                ).fetchall()
+        for row in rows:
+            chat_id = row["chat_id"]
+            if chat_id in results and results[chat_id] is not None:
+                continue
+            if chat_id not in results and len(results) >= limit:
+                continue
+            results[chat_id] = self._snippet(row["content"], tokens)
+        return list(results.items())
+
+    def _search_like(self, query: str) -> list:
+        # The query is literal text, so its wildcards are escaped
+        escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        with self.lock:
+            return [
+                row["id"]
+                for row in self.connection.execute(
+                    r"""
+                    SELECT id FROM chats WHERE title LIKE ? ESCAPE '\'
+                    UNION
+                    SELECT DISTINCT chat_id FROM messages WHERE content LIKE ? ESCAPE '\'
+                    """,
+                    (pattern, pattern),
+                )
+            ]
+
+    def close(self):
+        try:
+            with self.pending_condition:
+                if self._closed:
+                    return
+                self._closed = True
+                self.pending_condition.notify_all()
+            with self.lock:
+                self.checkpoint()
+                self.connection.close()
+        except Exception as e:
+            logging.error(f"Error closing chat store: {e}", exc_info=True)
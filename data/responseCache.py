@@ -0,0 +1,117 @@
+import json
+import sqlite3
+import hashlib
+import threading
+import logging
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+
+class ResponseCache:
+    """
+    Content-addressed cache for LLM answers that only depend on their request, such as titles.
+
+    Entries live in an in-memory LRU and, if a folder is given, in a SQLite file so they
+    survive restarts. Both tiers expire entries ttl seconds after they were stored.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 86400, folder: Optional[Path] = None,
+                 file_name: str = "response_cache.db", max_disk_entries: int = 5000):
+        """
+        :param max_entries: Entries kept in memory.
+        :param ttl: Seconds an entry stays valid.
+        :param folder: Where the on-disk tier lives, usually the config folder. None keeps the cache in memory only.
+        :param file_name: The name of the on-disk tier's database file.
+        :param max_disk_entries: Entries kept on disk, the oldest are dropped first.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_disk_entries = max_disk_entries
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (stored_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.connection = None
+        if folder is not None:
+            self.connection = sqlite3.connect(Path(folder) / file_name, check_same_thread=False)
+            with self.connection:
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, stored_at REAL NOT NULL, value TEXT NOT NULL)"
+                )
+            self._prune_disk()
+
+    @staticmethod
+    def key(model_name: str, prompt: str, options: Optional[Dict] = None) -> str:
+        """The cache key of a request: a hash of the model, the prompt and the options."""
+        payload = json.dumps([model_name, prompt, options or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _expired(self, stored_at: float) -> bool:
+        return time.time() - stored_at > self.ttl
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self.entries[key]
+                entry = None
+            if entry is None and self.connection is not None:
+                row = self.connection.execute(
+                    "SELECT stored_at, value FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[0]):
+                    entry = (row[0], json.loads(row[1]))
+                    self._remember(key, entry)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: Dict):
+        entry = (time.time(), value)
+        with self.lock:
+            self._remember(key, entry)
+            if self.connection is not None:
+                try:
+                    with self.connection:
+                        self.connection.execute(
+                            "INSERT OR REPLACE INTO responses (key, stored_at, value) VALUES (?, ?, ?)",
+                            (key, entry[0], json.dumps(value))
+                        )
+                except sqlite3.Error as e:
+                    logging.warning(f"Could not store cached response: {e}")
+
+    def _remember(self, key: str, entry: tuple):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _prune_disk(self):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses WHERE stored_at < ?", (time.time() - self.ttl,))
+            self.connection.execute(
+                "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY stored_at DESC LIMIT ?)",
+                (self.max_disk_entries,)
+            )
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            if self.connection is not None:
+                with self.connection:
+                    self.connection.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
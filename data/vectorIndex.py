@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # Semantic search is optional
+    np = None
+
+
+class VectorIndex:
+    """
+    Store of normalized message embeddings; new ones are appended, removing any rewrites the files.
+
+    Vectors are kept as float16 rows in a memory-mapped file next to a parallel file of
+    message ids, so the index costs almost no resident memory until it is queried.
+    """
+
+    def __init__(self, folder: Path, name: str = "embeddings"):
+        """
+        Open (or create) the index files.
+
+        :param folder: The folder the index files live in, usually the config folder.
+        :param name: The base name of the index files.
+        """
+        if np is None:
+            raise ImportError("numpy is required for semantic search")
+        folder = Path(folder)
+        self.vectors_file = folder / f"{name}.f16"
+        self.ids_file = folder / f"{name}.ids"
+        self.meta_file = folder / f"{name}.json"
+        self.lock = threading.Lock()
+        self.meta = {}
+        if self.meta_file.exists():
+            with self.meta_file.open("r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+        self._vectors = None
+        self._ids = None
+        self._count = self._stored_count()
+
+    @property
+    def dim(self):
+        return self.meta.get("dim")
+
+    @property
+    def model(self):
+        return self.meta.get("model")
+
+    def __len__(self):
+        return self._count
+
+    def _stored_count(self) -> int:
+        if not self.dim or not self.ids_file.exists() or not self.vectors_file.exists():
+            return 0
+        # A crash between the two appends can leave one file a row ahead
+        return min(self.ids_file.stat().st_size // 8, self.vectors_file.stat().st_size // (2 * self.dim))
+
+    def reset(self, model: str, dim: int):
+        """Drop every vector, e.g. because the embedding model changed."""
+        with self.lock:
+            self.vectors_file.write_bytes(b"")
+            self.ids_file.write_bytes(b"")
+            self.meta = {"model": model, "dim": dim}
+            with self.meta_file.open("w", encoding="utf-8") as f:
+                json.dump(self.meta, f)
+            self._vectors = self._ids = None
+            self._count = 0
+
+    def max_id(self) -> int:
+        """The highest message id in the index, 0 if it is empty."""
+        with self.lock:
+            ids = self._load()[1]
+            return int(ids.max()) if len(ids) else 0
+
+    def add(self, message_ids: list, vectors):
+        """
+        Append embeddings for the given messages.
+
+        :param message_ids: The ids of the embedded messages.
+        :param vectors: A (len(message_ids), dim) array of embeddings, normalized here.
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = (vectors / np.maximum(norms, 1e-12)).astype(np.float16)
+        with self.lock:
+            with self.vectors_file.open("ab") as f:
+                f.write(vectors.tobytes())
+            with self.ids_file.open("ab") as f:
+                f.write(np.asarray(message_ids, dtype=np.int64).tobytes())
+            self._count += len(message_ids)
+            self._vectors = self._ids = None  # Re-map on the next query
+
+    def remove(self, message_ids: list) -> int:
+        """
+        Drop the embeddings of the given messages, e.g. because they were deleted. Rewrites both files.
+
+        :return: How many embeddings were removed.
+        """
+        with self.lock:
+            vectors, ids = self._load()
+            keep = ~np.isin(ids, np.asarray(message_ids, dtype=np.int64))
+            kept = int(keep.sum())
+            if kept == len(ids):
+                return 0
+            kept_vectors, kept_ids = vectors[keep], ids[keep]
+            # The memory maps must be closed before their files can be replaced
+            del vectors, ids
+            self._vectors = self._ids = None
+            for path, rows in ((self.vectors_file, kept_vectors), (self.ids_file, kept_ids)):
+                temporary = path.with_name(path.name + ".tmp")
+                temporary.write_bytes(rows.tobytes())
+                os.replace(temporary, path)
+            removed, self._count = self._count - kept, kept
+            return removed
+
+    def _load(self):
+        if self._vectors is None:
+            if self._count == 0:
+                self._vectors = np.zeros((0, self.dim or 0), dtype=np.float16)
+                self._ids = np.zeros(0, dtype=np.int64)
+            else:
+                self._vectors = np.memmap(self.vectors_file, dtype=np.float16, mode="r", shape=(self._count, self.dim))
+                self._ids = np.memmap(self.ids_file, dtype=np.int64, mode="r", shape=(self._count,))
+        return self._vectors, self._ids
+
+    def query(self, vector, k: int = 10, block_rows: int = 65536) -> list:
+        """
+        Return the k stored messages most similar to the vector by cosine similarity.
+
+        :param vector: The query embedding.
+        :param k: How many results to return.
+        :param block_rows: Rows converted to float32 at a time, bounds the temporary memory.
+        :return: A list of (message_id, score) tuples, best first.
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+        with self.lock:
+            vectors, ids = self._load()
+            if len(ids) == 0:
+                return []
+            scores = np.empty(len(ids), dtype=np.float32)
+            for start in range(0, len(ids), block_rows):
+                block = vectors[start:start + block_rows]
+                scores[start:start + len(block)] = block.astype(np.float32) @ query
+            k = min(k, len(scores))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(int(ids[i]), float(scores[i])) for i in top]
@@ -0,0 +1,50 @@
+from concurrent.futures import Future
+from typing import Coroutine, Optional
+import asyncio
+import threading
+import logging
+
+
+class EventLoopThread:
+    """
+    One asyncio event loop running on a daemon thread for the lifetime of the app.
+
+    Async clients bind their connection pool to the loop they are first used on, so every
+    coroutine using them has to be submitted here rather than run with asyncio.run().
+    """
+
+    def __init__(self, name: str = "event-loop"):
+        self.name = name
+        self.lock = threading.Lock()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.thread: Optional[threading.Thread] = None
+
+    def _ensure_running(self) -> asyncio.AbstractEventLoop:
+        with self.lock:
+            if self.loop is None or self.loop.is_closed():
+                self.loop = asyncio.new_event_loop()
+                self.thread = threading.Thread(target=self._run, args=(self.loop,), daemon=True, name=self.name)
+                self.thread.start()
+            return self.loop
+
+    @staticmethod
+    def _run(loop: asyncio.AbstractEventLoop):
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def submit(self, coroutine: Coroutine) -> Future:
+        """Schedule a coroutine on the loop, returns a concurrent.futures.Future for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._ensure_running())
+
+    def run(self, coroutine: Coroutine, timeout: Optional[float] = None):
+        """Run a coroutine on the loop and wait for its result from another thread."""
+        return self.submit(coroutine).result(timeout)
+
+    def stop(self):
+        with self.lock:
+            if self.loop is not None and not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self.loop.stop)
+                logging.debug(f"Stopping {self.name}")
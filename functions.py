@@ -1,104 +1,387 @@
-from data import Config
-import os, signal, uuid
-import webview
+from data import Config, ChatStore, VectorIndex, ResponseCache
+import os, signal, uuid, hashlib, functools, atexit
 import shared
-from llmFunctions import Model, Message, MessageRole, Chat
+from llmFunctions import Model, MessageRole, Chat, EmbeddingIndexer
+from contextManager import ContextBuilder
+from sessions import SessionManager
+from scheduler import GenerationScheduler, Priority
+from jobs import JobQueue
+from ollamaClient import OllamaHTTP
+from modelCatalog import ModelCatalog
+from promptTemplates import PromptRegistry
+from concurrent.futures import Future
 import json
 from datetime import datetime
 import traceback
 import logging
+import time
+import threading
 import eel
+from startup import timer
+from metrics import metrics, BYTES
 
-config = Config("kosmos.chat", load_on_get=True)
+config = Config.instance("kosmos.chat", load_on_get=True)
+# Per-call details are logged at DEBUG
+logging.getLogger().setLevel(config.get("log_level", "INFO"))
+
+def _record_flush(seconds: float, size: int):
+    metrics.observe("store_flush_ms", seconds * 1000)
+    metrics.observe("store_flush_bytes", size, unit="bytes", bounds=BYTES)
+
+# Chats live in their own database next to config.json
+store = ChatStore(
+    config.config_folder,
+    batch_interval=config.get("store_batch_ms", 50) / 1000,
+    max_batch_delay=config.get("store_max_batch_ms", 1000) / 1000,
+    checkpoint_interval=config.get("store_checkpoint_interval", 300),
+    on_flush=_record_flush
+)
+# Closing the window ends the process on daemon threads; commit the last batch on the way out
+atexit.register(store.close)
 # Initialize the model (singleton instance used by all functions)
-model = Model()
+context_builder = ContextBuilder(
+    default_budget=config.get("context_budget", 4096),
+    budgets=config.get("context_budgets", {}),
+    strategy=config.get("context_strategy", "pinned_system"),
+    keep_first=config.get("context_keep_first", 2)
+)
+ollama_url = config.get("ollama_url", "http://localhost:11434")
+response_cache = None
+if config.get("response_cache", True):
+    response_cache = ResponseCache(
+        max_entries=config.get("response_cache_size", 256),
+        ttl=config.get("response_cache_ttl", 86400),
+        folder=config.config_folder if config.get("response_cache_disk", False) else None
+    )
+ollama_http = OllamaHTTP(
+    ollama_url,
+    connect_timeout=config.get("http_connect_timeout", 5.0),
+    read_timeout=config.get("http_read_timeout", 300.0),
+    retries=config.get("http_retries", 2),
+    pool_size=config.get("http_pool_size", 8)
+)
+model = Model(
+    base_url=ollama_url,
+    store=store,
+    max_loaded_chats=config.get("max_loaded_chats", 16),
+    context_builder=context_builder,
+    sessions=SessionManager(
+        keep_alive=config.get("keep_alive", "30m"),
+        keep_alive_per_model=config.get("keep_alive_per_model", {}),
+        context_size=context_builder.context_size
+    ),
+    scheduler=GenerationScheduler(
+        max_per_model=config.get("max_parallel_per_model", 2),
+        max_per_model_overrides=config.get("max_parallel_overrides", {})
+    ),
+    jobs=JobQueue(
+        workers=config.get("background_workers", 2),
+        idle_delay=config.get("idle_delay", 2.0)
+    ),
+    http=ollama_http,
+    response_cache=response_cache,
+    prompts=PromptRegistry(reload_interval=config.get("prompt_reload_interval", 2.0)),
+    catalog=ModelCatalog(ollama_http, refresh_interval=config.get("model_refresh_interval", 60))
+)
+model.prompts.start()
+
+class ChunkCoalescer:
+    """
+    Buffers streamed tokens and hands them to the frontend in larger pieces.
+
+    A piece is sent once the buffer holds max_bytes or interval seconds have passed since the
+    last send; a flusher thread, one per stream, sends it when the model pauses before the next
+    token. Use it as a context manager, or call close() when the stream ends.
+    """
+
+    def __init__(self, send, interval: float = 0.025, max_bytes: int = 2048):
+        self.send = send
+        self.interval = interval
+        self.max_bytes = max_bytes
+        self.parts = []
+        self.size = 0
+        self.last_flush = time.monotonic()
+        self.condition = threading.Condition()  # Tokens arrive on the stream's thread, pauses are flushed by the flusher
+        self.flusher = None
+        self.closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def push(self, chunk: str):
+        if chunk.startswith("<ERROR>"):
+            # The frontend recognizes errors by their prefix, so they are never merged
+            self.flush()
+            self.send(chunk)
+            return
+        with self.condition:
+            self.parts.append(chunk)
+            self.size += len(chunk)
+            if self.size >= self.max_bytes or time.monotonic() - self.last_flush >= self.interval:
+                self._send_parts()
+                return
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self._flush_loop, name="chunk-flusher", daemon=True)
+                self.flusher.start()
+            elif len(self.parts) == 1:
+                # The flusher sleeps until something is buffered
+                self.condition.notify()
+
+    def _flush_loop(self):
+        with self.condition:
+            while not self.closed:
+                if not self.parts:
+                    self.condition.wait()
+                    continue
+                wait = self.last_flush + self.interval - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                else:
+                    self._send_parts()
+
+    def _send_parts(self):
+        # Called with the condition held, which keeps flusher and token sends in order
+        if self.parts:
+            self.send("".join(self.parts))
+            self.parts = []
+            self.size = 0
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self.condition:
+            self._send_parts()
+
+    def close(self):
+        """Send what is left and stop the flusher."""
+        with self.condition:
+            self._send_parts()
+            self.closed = True
+            self.condition.notify()
+
+def _chunk_coalescer(chat_id: str) -> ChunkCoalescer:
+    # Chunks carry their chat id, the window may be showing another chat by now
+    return ChunkCoalescer(
+        lambda text: eel.receive_chunk(text, chat_id),
+        interval=config.get("stream_flush_ms", 25) / 1000,
+        max_bytes=config.get("stream_flush_bytes", 2048)
+    )
+
+def _generation_chat(chat_id=None) -> Chat:
+    """The chat a reply is generated for; other chats can keep streaming while the user switches."""
+    chat = model.get_chat(chat_id, make_current=False) if chat_id else model.current_chat
+    if not chat:
+        raise Exception("No active chat")
+    return chat
+
+_title_windows = {}  # Chat id -> hash of the messages its title was last generated from
+
+def _title_window(chat: Chat):
+    # Get last 4 messages for context
+    conversation_history = [
+        f"{msg.role.value}: {msg.content}" 
+        for msg in chat.messages[-4:]
+    ]
+    digest = hashlib.sha256("\n".join(conversation_history).encode("utf-8")).hexdigest()
+    return conversation_history, digest
+
+def _generate_title(chat: Chat, conversation_history: list, digest: str) -> str:
+    new_title = model.generate_title(
+        conversation_history=conversation_history,
+        previous_title=chat.title,
+        model_name=chat.model_name
+    )
+    _title_windows[chat.id] = digest
+    
+    # Only update if title changed
+    if new_title != chat.title:
+        chat.title = new_title
+        chat.last_message_at = datetime.now()
+        model.save_chat(chat)
+    return new_title
+
+def _push_title(chat_id: str, job: Future):
+    if job.cancelled():
+        return  # Replaced by a newer request, or the chat was deleted
+    try:
+        response = {"success": True, "title": job.result()}
+    except Exception as e:
+        logging.error(f"Error generating title: {str(e)}")
+        response = {"error": str(e)}
+    eel.receive_title(chat_id, response)
+
+def _push_enhanced_prompt(chat_id: str, job: Future):
+    if job.cancelled():
+        return
+    try:
+        response = {"prompt": model.strip_thinking(job.result().response)}
+    except Exception as e:
+        print(f"Error enhancing prompt: {str(e)}")
+        response = {"error": f"Error enhancing prompt: {str(e)}"}
+    eel.receive_enhanced_prompt(chat_id, response)
+
+async def _stream_response(prompt: str, chat: Chat):
+    try:
+        # Add the user prompt to the chat history
+        model.add_message(MessageRole.USER, prompt, os.getenv("username"), chat=chat)
+        full_response = []
+        with _chunk_coalescer(chat.id) as coalescer:
+            async for chunk in model.generate_async(prompt, stream=True, add_to_history=False, chat_id=chat.id):
+                full_response.append(chunk)
+                coalescer.push(chunk)
+        if not full_response:
+            # Stopped before the first token, e.g. while waiting for a free slot; there is no reply to keep
+            eel.generation_cancelled(chat.id)
+            return
+        model.add_message(MessageRole.ASSISTANT, "".join(full_response), chat.model_name, chat=chat)
+        _maybe_compact(chat)
+        eel.generation_complete(chat.id)
+    except Exception as e:
+        eel.receive_chunk(f"<ERROR>{str(e)}</ERROR>", chat.id)
+        logging.error(f"Generation error: {str(e)}")
+
+def _generate_reply(prompt: str, chat: Chat):
+    # Runs on its own thread: Eel handlers block the whole bridge until they return
+    try:
+        # Get the generator (streaming generator with add_to_history=False)
+        generator = model.generate(prompt, stream=True, add_to_history=False, chat_id=chat.id)
+        full_response = []
+
+        # Stream chunks to JavaScript, batched so fast models don't flood the bridge
+        with _chunk_coalescer(chat.id) as coalescer:
+            for chunk in generator:
+                full_response.append(chunk)
+                coalescer.push(chunk)
+        if not full_response:
+            # Stopped before the first token, e.g. while waiting for a free slot; there is no reply to keep
+            eel.generation_cancelled(chat.id)
+            return
+
+        # Add final assistant message
+        model.add_message(MessageRole.ASSISTANT, "".join(full_response), chat.model_name, chat=chat)
+        _maybe_compact(chat)
+        eel.generation_complete(chat.id)
+    except Exception as e:
+        eel.receive_chunk(f"<ERROR>{str(e)}</ERROR>", chat.id)
+        logging.error(f"Generation error: {str(e)}")
+
+def _maybe_compact(chat):
+    """Start summarizing old turns of a long chat in the background, if enabled."""
+    if config.get("compact_history", False):
+        model.maybe_compact(
+            chat,
+            threshold_tokens=config.get("compact_threshold_tokens", 3000),
+            keep_recent=config.get("compact_keep_recent", 6)
+        )
+
+def _migrate_config_chats():
+    """Move chats from the legacy "chats" key of config.json into the chat store."""
+    chats_data = config.get("chats")
+    if chats_data is None:
+        return
+    try:
+        existing = store.chat_ids()
+        migrated, failed = 0, 0
+        for chat_dict in chats_data:
+            if chat_dict.get("id") in existing:
+                continue
+            try:
+                store.add_chat(Chat.from_dict(chat_dict))
+                migrated += 1
+            except Exception as e:
+                failed += 1
+                logging.error(f"Error migrating chat {chat_dict.get('id', 'unknown')}: {e}", exc_info=True)
+        # Writes are batched, so check what actually got stored
+        stored = store.chat_ids()
+        failed = sum(1 for chat_dict in chats_data if chat_dict.get("id") not in stored)
+        # Keep the legacy copy around if anything could not be moved
+        if not failed:
+            config.delete("chats")
+        logging.info(f"Migrated {migrated} chats from config to the chat store ({failed} failed)")
+    except Exception as e:
+        logging.error(f"Error migrating chats: {e}", exc_info=True)
 
 def _save_chats():
+    """Mark every loaded chat dirty; the chat store writes them with its next batch."""
     try:
-        chats_data = []
         for chat in model.chats.values():
-            chat_dict = {
-                "id": chat.id,
-                "type": chat.type,
-                "title": chat.title,
-                "created_at": chat.created_at.isoformat(),
-                "last_message_at": chat.last_message_at.isoformat(),
-                "system_prompt": chat.system_prompt,
-                "model_name": chat.model_name,
-                "messages": [
-                    {
-                        "role": msg.role.value,
-                        "content": msg.content,
-                        "name": msg.name,
-                        "timestamp": msg.timestamp.isoformat()
-                    }
-                    for msg in chat.messages
-                ]
-            }
-            chats_data.append(chat_dict)
-        config.set("chats", chats_data)
-        logging.info(f"Saved {len(chats_data)} chats to config")
+            store.save_chat(chat)
+        logging.info(f"Saved {len(model.chats)} chats to the chat store")
     except Exception as e:
         logging.error(f"Error saving chats: {e}", exc_info=True)
 
 def _load_chats():
-    """Load chats from config."""
+    """Refresh the chat summary index from the chat store. Messages are loaded on demand by model.get_chat."""
     try:
-        # Clear existing chats
-        model.chats.clear()
-        
-        chats_data = config.get("chats", [])
-        print(f"Loading {len(chats_data)} chats from config")
-        
-        for chat_dict in chats_data:
-            try:
-                chat = Chat(
-                    id=chat_dict["id"],
-                    type=chat_dict["type"],
-                    title=chat_dict["title"],
-                    created_at=datetime.fromisoformat(chat_dict["created_at"]),
-                    last_message_at=datetime.fromisoformat(chat_dict["last_message_at"]),
-                    system_prompt=chat_dict["system_prompt"],
-                    model_name=chat_dict.get("model_name", "llama2"),
-                    messages=[
-                        Message(
-                            role=MessageRole(msg["role"]),
-                            content=msg["content"],
-                            name=msg["name"],
-                            timestamp=datetime.fromisoformat(msg["timestamp"])
-                        )
-                        for msg in chat_dict["messages"]
-                    ]
-                )
-                model.chats[chat.id] = chat
-                print(f"Loaded chat: {chat.id} - {chat.title}")
-            except Exception as e:
-                print(f"Error loading chat {chat_dict.get('id', 'unknown')}: {str(e)}")
-                traceback.print_exc()
-                continue
+        model.load_summaries()
+        logging.info(f"Indexed {len(model.summaries)} chats from the chat store")
     except Exception as e:
         print(f"Error loading chats: {str(e)}")
         traceback.print_exc()
 
-# Load existing chats on startup
-_load_chats()
+def _start_semantic_search():
+    """Embed messages in the background so find_similar_chats can answer. Needs numpy."""
+    if not config.get("semantic_search", True):
+        return
+    try:
+        index = VectorIndex(config.config_folder)
+    except ImportError as e:
+        logging.info(f"Semantic search disabled: {e}")
+        return
+    model.indexer = EmbeddingIndexer(index, store, ollama_http, config.get("embedding_model", "nomic-embed-text"))
+    model.indexer.start()
+
+chats_ready = threading.Event()
+
+def _load_chats_in_background():
+    with timer.phase("migrate config chats"):
+        _migrate_config_chats()
+    # Index existing chats on startup, messages are loaded lazily
+    with timer.phase("load chat index"):
+        _load_chats()
+    chats_ready.set()
+    eel.chats_ready()  # The page got None from get_chats while loading
+    with timer.phase("start semantic search"):
+        _start_semantic_search()
+
+def _record_model_discovery():
+    model.catalog.ready.wait()
+    timer.mark("models discovered")
+    eel.models_ready()  # The page may be showing the fallback model
+
+def start_background_tasks():
+    """Load the chat index and ask Ollama for its models without holding up the window."""
+    threading.Thread(target=_load_chats_in_background, daemon=True, name="startup-chats").start()
+    # The catalog refreshes now and then on its own timer
+    model.catalog.start()
+    threading.Thread(target=_record_model_discovery, daemon=True, name="startup-models").start()
+
+def page_closed(page, sockets):
+    """Eel close_callback: a page was closed or left for another one, commit the writes it queued."""
+    store.flush()
 
 class funcs:
     def greet():
         return f"Hello, {os.getenv('username')}!"
 
     def minimize_application():
+        import webview  # Loaded by main.py once the server is up
         webview.active_window().minimize()
 
     def stop_application():
         print("🛑 Stopping the application...")
         _save_chats()  # Save chats before stopping
+        store.flush()  # Writes are batched, commit the last batch before exiting
+        model.jobs.shutdown()
         try:
             os.kill(os.getpid(), signal.SIGTERM)
         except Exception as e:
             print(f"Error while stopping: {e}")
 
     def drag_window(dx, dy):
+        import webview
         window = webview.windows[0]
         try:
             current_x = window.x  
@@ -111,98 +394,85 @@ class funcs:
         window.move(new_x, new_y)
 
     def enhance_prompt(prompt: str):
+        """Queue the enhancement and return at once; the result arrives through receive_enhanced_prompt."""
         try:
             if not model.current_chat:
                 raise Exception("No active chat")
             
             prompt = (
                 "Enhance the following prompt to improve its clarity, creativity, and effectiveness. "
-                "Return only the final, enhanced prompt with no additional commentary"
+                "Return only the final, enhanced prompt with no additional commentary\n\n"
+                f"{prompt}"
             )
 
-            response = model.plainGen(prompt).response
-            response = model.strip_thinking(response)
-            
-            return response
+            chat = model.current_chat
+            job = model.jobs.submit(
+                model.plainGen, prompt, chat.model_name, Priority.ENHANCE, True,
+                priority=Priority.ENHANCE, key=("enhance", chat.id)
+            )
+            job.add_done_callback(functools.partial(_push_enhanced_prompt, chat.id))
+            return {"status": "started", "chat_id": chat.id}
         except Exception as e:
             print(f"Error enhancing prompt: {str(e)}")
             traceback.print_exc()
-            return f"Error enhancing prompt: {str(e)}"
+            return {"error": f"Error enhancing prompt: {str(e)}"}
 
     def generate_title(chat_id: str):
+        """
+        Queue a new title and return at once; it arrives through receive_title. Answers right away
+        when nothing changed since the last title.
+        """
         try:
-            chat = model.get_chat(chat_id)
+            chat = model.get_chat(chat_id, make_current=False)
             if not chat:
                 return {"error": "Chat not found"}
-            
-            # Get last 4 messages for context
-            conversation_history = [
-                f"{msg.role.value}: {msg.content}" 
-                for msg in chat.messages[-4:]
-            ]
-            
-            new_title = model.generate_title(
-                conversation_history=conversation_history,
-                previous_title=chat.title
+            conversation_history, digest = _title_window(chat)
+            if _title_windows.get(chat.id) == digest:
+                return {"success": True, "title": chat.title}  # Nothing new to title
+            # A newer request for the same chat replaces this one while it is still queued
+            job = model.jobs.submit(
+                _generate_title, chat, conversation_history, digest,
+                priority=Priority.BACKGROUND, key=("title", chat.id)
             )
-            
-            # Only update if title changed
-            if new_title != chat.title:
-                chat.title = new_title
-                chat.last_message_at = datetime.now()
-                _save_chats()
-            
-            return {"success": True, "title": new_title}
+            job.add_done_callback(functools.partial(_push_title, chat.id))
+            return {"status": "started"}
         except Exception as e:
             logging.error(f"Error generating title: {str(e)}")
             return {"error": str(e)}
 
-    async def stream_response(prompt: str):
+    def stream_response(prompt: str, chat_id: str = None):
+        """
+        Start a reply on the shared event loop and return at once; chunks arrive through receive_chunk.
+        """
         try:
-            if not model.current_chat:
-                raise Exception("No active chat")
-            # Add the user prompt to the chat history
-            model.add_message(MessageRole.USER, prompt, os.getenv("username"))
-            full_response = ""
-            # Use model.generate_async instead of the undefined model_instance
-            async for chunk in model.generate_async(prompt, stream=True, add_to_history=False):
-                full_response += chunk
-                eel.receive_chunk(chunk)
-            model.add_message(MessageRole.ASSISTANT, full_response, model.current_chat.model_name)
-            _save_chats()
-            eel.generation_complete()
+            chat = _generation_chat(chat_id)
+            model.event_loop.submit(_stream_response(prompt, chat))
+            return {"status": "started", "chat_id": chat.id}
         except Exception as e:
-            eel.receive_chunk(f"<ERROR>{str(e)}</ERROR>")
             logging.error(f"Generation error: {str(e)}")
+            return {"error": str(e)}
 
-    def start_generating(prompt: str):
+    def start_generating(prompt: str, chat_id: str = None):
+        """
+        Start a reply on a worker thread and return at once; chunks arrive through receive_chunk,
+        the end through generation_complete.
+        """
         try:
-            if not model.current_chat:
-                raise Exception("No active chat")
-            
-            model.add_message(MessageRole.USER, prompt, os.getenv("username"))
-            # Get the generator (streaming generator with add_to_history=False)
-            generator = model.generate(prompt, stream=True, add_to_history=False)
-            full_response = ""
-            
-            # Stream chunks to JavaScript
-            for chunk in generator:
-                full_response += chunk
-                eel.receive_chunk(chunk)
-
-            # Add final assistant message
-            model.add_message(MessageRole.ASSISTANT, full_response, model.current_chat.model_name)
-            _save_chats()
-            eel.generation_complete()
-            
+            chat = _generation_chat(chat_id)
+            model.add_message(MessageRole.USER, prompt, os.getenv("username"), chat=chat)
+            threading.Thread(target=_generate_reply, args=(prompt, chat), daemon=True, name=f"reply-{chat.id}").start()
+            return {"status": "started", "chat_id": chat.id}
         except Exception as e:
-            eel.receive_chunk(f"<ERROR>{str(e)}</ERROR>")
             logging.error(f"Generation error: {str(e)}")
+            return {"error": str(e)}
 
     @staticmethod
-    def stop_generating():
-        model.stop_generation = True
+    def stop_generating(chat_id: str = None):
+        model.stop_generating(chat_id)
         return {"status": "stopped"}
+
+    def get_generation_stats():
+        return {"running": list(model.generations), "models": model.scheduler.stats(), "jobs": model.jobs.stats()}
     
     def current_model_name():
         return model.current_chat.model_name
@@ -226,14 +496,51 @@ class funcs:
         ]
 
     def get_available_models():
+        """The last known models, the fallback model until Ollama answered; models_ready is pushed then."""
         return model.get_available_models()
 
+    def refresh_models():
+        """Ask Ollama for its models again, e.g. after pulling one; get_available_models has them shortly after."""
+        model.catalog.request_refresh()
+        return {"status": "refreshing"}
+
+    def get_model_details():
+        """Context length, parameter size, quantization and loaded state of every installed model."""
+        return model.catalog.describe()
+
+    def get_metrics(bridge_roundtrip_ms: float = None):
+        """
+        Histograms of the hot paths: time to first token, tokens/sec, prompt eval, model load,
+        Eel calls, chat store commits and search.
+
+        :param bridge_roundtrip_ms: The page's measured round trip of its previous get_metrics call.
+        """
+        if bridge_roundtrip_ms is not None:
+            metrics.observe("bridge_roundtrip_ms", float(bridge_roundtrip_ms))
+        return metrics.snapshot()
+
+    def get_startup_report():
+        """How long each startup phase took."""
+        return timer.report()
+
+    def get_persistence_stats():
+        """Chat store batch commit latency and bytes written."""
+        return store.stats()
+
+    def get_session_stats():
+        """Time-to-first-token statistics per model."""
+        return model.sessions.stats()
+
     def get_chats():
-        """Get all chats for display. Reloads chats from config to ensure consistency."""
+        """
+        Get all chats for display, answered from the in-memory summary index.
+        None while the index is still loading at startup; chats_ready is pushed once it is loaded.
+        """
         try:
-            _load_chats()  # refresh chats from disk
-            chats = model.get_all_chats()
-            print(f"Getting {len(chats)} chats for display")
+            if not chats_ready.is_set():
+                return None
+            chats = model.get_chat_summaries()
+            logging.debug(f"Getting {len(chats)} chats for display")
             return [
                 {
                     "id": chat.id,
@@ -250,21 +557,54 @@ class funcs:
             return []
 
     def search_chats(query: str):
-        chats = model.search_chats(query)
-        return [
-            {
-                "id": chat.id,
-                "title": chat.title,
-                "type": chat.type,
-                "created_at": chat.created_at.isoformat(),
-                "last_message_at": chat.last_message_at.isoformat()
-            }
-            for chat in sorted(chats, key=lambda x: x.last_message_at, reverse=True)
-        ]
+        """Search chats by title and message content. Results keep their relevance order."""
+        try:
+            if not chats_ready.is_set():
+                return []  # Nothing to search yet
+            with metrics.time("search_ms"):
+                results = model.search_chats(query)
+            return [
+                {
+                    "id": result.chat.id,
+                    "title": result.chat.title,
+                    "type": result.chat.type,
+                    "created_at": result.chat.created_at.isoformat(),
+                    "last_message_at": result.chat.last_message_at.isoformat(),
+                    "snippet": result.snippet
+                }
+                for result in results
+            ]
+        except Exception as e:
+            print(f"Error searching chats: {str(e)}")
+            traceback.print_exc()
+            return []
+
+    def find_similar_chats(query: str):
+        """Find conversations semantically similar to the query, most similar first."""
+        try:
+            with metrics.time("semantic_search_ms"):
+                results = model.find_similar_chats(query)
+            return [
+                {
+                    "id": result.chat.id,
+                    "title": result.chat.title,
+                    "type": result.chat.type,
+                    "created_at": result.chat.created_at.isoformat(),
+                    "last_message_at": result.chat.last_message_at.isoformat(),
+                    "snippet": result.snippet
+                }
+                for result in results
+            ]
+        except Exception as e:
+            print(f"Error finding similar chats: {str(e)}")
+            traceback.print_exc()
+            return []
 
     def switch_chat(chat_id: str):
         try:
             model.set_current_chat(chat_id)
+            # Warm the chat's model up while the page loads
+            model.sessions.preload(model.current_chat.model_name)
             return {"success": True}
         except Exception as e:
             print(f"Error switching chat: {str(e)}")
@@ -274,7 +614,6 @@ class funcs:
     def delete_chat(chat_id: str):
         try:
             model.delete_chat(chat_id)
-            _save_chats()
             return {"success": True}
         except Exception as e:
             print(f"Error deleting chat: {str(e)}")
@@ -285,26 +624,37 @@ class funcs:
         try:
             # Use uuid for a unique chat id inside create_chat
             chat = model.create_chat(chat_type, model_name)
-            _save_chats()
-            print(f"Created new chat: {chat.id} - {chat.title}")
+            model.sessions.preload(chat.model_name)
+            logging.debug(f"Created new chat: {chat.id}")
             return {"success": True, "chat_id": chat.id}
         except Exception as e:
             print(f"Error creating new chat: {str(e)}")
             traceback.print_exc()
             return {"success": False, "error": str(e)}
 
-    def get_chat(chat_id: str):
+    def get_chat(chat_id: str, before: int = None, limit: int = None):
+        """
+        Get a chat with one page of its messages, newest page first.
+
+        :param before: Cursor from a previous page; only messages before it are returned.
+        :param limit: Page size, defaults to the message_page_size config value.
+        """
         try:
-            print(f"Getting chat with ID: {chat_id}")
             chat = model.get_chat(chat_id)
             if chat:
-                print(f"Found chat: {chat.id} - {chat.title} ({len(chat.messages)} messages)")
+                if limit is None:
+                    limit = config.get("message_page_size", 50)
+                end = len(chat.messages) if before is None else max(0, min(before, len(chat.messages)))
+                start = max(0, end - limit)
                 return {
                     "id": chat.id,
                     "title": chat.title,
                     "type": chat.type,
                     "created_at": chat.created_at.isoformat(),
                     "last_message_at": chat.last_message_at.isoformat(),
+                    "message_count": len(chat.messages),
+                    "cursor": start,
+                    "has_more": start > 0,
                     "messages": [
                         {
                             "role": msg.role.value,
@@ -312,14 +662,30 @@ class funcs:
                             "name": msg.name,
                             "timestamp": msg.timestamp.isoformat()
                         }
-                        for msg in chat.messages
+                        for msg in chat.messages[start:end]
+                        if msg.summary_of is None  # History summaries are for the model only
                     ]
                 }
-            print(f"Chat not found: {chat_id}")
+            logging.debug(f"Chat not found: {chat_id}")
             return None
         except Exception as e:
             print(f"Error getting chat {chat_id}: {str(e)}")
             traceback.print_exc()
             return None
 
-functionsList = [getattr(funcs, name) for name in dir(funcs) if callable(getattr(funcs, name)) and not name.startswith("__")]
+# Calls that do not answer the page: stop_application ends the process. Replies, titles and prompt
+# enhancement run in the background and return once started, so only their dispatch is timed.
+_untimed = {"stop_application"}
+
+def _timed(func):
+    """Record how long Python takes to answer a call from the page."""
+    @functools.wraps(func)  # Eel exposes functions under their __name__
+    def wrapper(*args, **kwargs):
+        with metrics.time("eel_call_ms"):
+            return func(*args, **kwargs)
+    return wrapper
+
+functionsList = [
+    getattr(funcs, name) if name in _untimed else _timed(getattr(funcs, name))
+    for name in dir(funcs) if callable(getattr(funcs, name)) and not name.startswith("__")
+]
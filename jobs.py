@@ -0,0 +1,131 @@
+from concurrent.futures import Future
+from itertools import count
+from typing import Callable, Dict, Hashable, Optional
+import heapq
+import threading
+import logging
+import time
+
+from scheduler import Priority
+
+
+class JobQueue:
+    """
+    Runs background LLM work (prompt enhancement, titles, history summaries) on a small pool of threads.
+
+    Jobs run by Priority, then in submission order. A job submitted with a key replaces a job with
+    the same key that has not started yet, so e.g. only the newest title request of a chat runs.
+    Priority.IDLE jobs wait until is_busy has reported False for idle_delay seconds.
+    """
+
+    def __init__(self, workers: int = 2, is_busy: Optional[Callable[[], bool]] = None, idle_delay: float = 2.0):
+        """
+        :param workers: How many jobs may run at once.
+        :param is_busy: Returns True while interactive work (e.g. a chat reply) is running;
+                        Model sets it to its running replies if left out.
+        :param idle_delay: Seconds without interactive work before idle jobs start.
+        """
+        self.workers = max(1, workers)
+        self.is_busy = is_busy
+        self.idle_delay = idle_delay
+        self.condition = threading.Condition()
+        self.heap = []
+        self.pending: Dict[Hashable, Future] = {}
+        self.threads = []
+        self.stopping = False
+        self.last_busy = time.monotonic()
+        self._sequence = count()
+
+    def submit(self, fn: Callable, *args, priority: int = Priority.BACKGROUND, key: Optional[Hashable] = None, **kwargs) -> Future:
+        """
+        Queue fn(*args, **kwargs).
+
+        :param priority: A Priority, lower runs first.
+        :param key: Identifies the job's purpose, e.g. ("title", chat_id); a queued job with the same key is dropped.
+        :return: A Future for the result. Futures of dropped jobs are cancelled.
+        """
+        future = Future()
+        with self.condition:
+            if self.stopping:
+                raise RuntimeError("The job queue is shut down")
+            if key is not None:
+                stale = self.pending.get(key)
+                if stale is not None and stale.cancel():
+                    logging.debug(f"Dropped stale job {key}")
+                self.pending[key] = future
+            heapq.heappush(self.heap, (int(priority), next(self._sequence), future, key, fn, args, kwargs))
+            if len(self.threads) < self.workers:
+                thread = threading.Thread(target=self._run, daemon=True, name=f"jobs-{len(self.threads)}")
+                self.threads.append(thread)
+                thread.start()
+            self.condition.notify()
+        return future
+
+    def cancel(self, key: Hashable) -> bool:
+        """
+        Drop the queued job with the key, e.g. because its chat was deleted. A job that already started keeps running.
+
+        :return: True if a job was dropped.
+        """
+        with self.condition:
+            future = self.pending.get(key)
+            if future is None or not future.cancel():
+                return False
+            del self.pending[key]
+            logging.debug(f"Cancelled job {key}")
+            return True
+
+    def _idle(self) -> bool:
+        if self.is_busy and self.is_busy():
+            self.last_busy = time.monotonic()
+            return False
+        return time.monotonic() - self.last_busy >= self.idle_delay
+
+    def _next(self):
+        """Pop the next runnable job, waiting as needed. Returns None once the queue is shut down."""
+        with self.condition:
+            while not self.stopping:
+                while self.heap and self.heap[0][2].cancelled():
+                    heapq.heappop(self.heap)
+                if self.heap and (self.heap[0][0] < Priority.IDLE or self._idle()):
+                    return heapq.heappop(self.heap)
+                # Idle jobs are re-checked periodically, everything else wakes us up
+                self.condition.wait(timeout=self.idle_delay / 4 if self.heap else None)
+            return None
+
+    def _run(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            _, _, future, key, fn, args, kwargs = job
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as e:
+                logging.error(f"Background job {key or fn.__name__} failed: {e}", exc_info=True)
+                future.set_exception(e)
+            finally:
+                with self.condition:
+                    if key is not None and self.pending.get(key) is future:
+                        del self.pending[key]
+
+    def stats(self) -> Dict[str, int]:
+        with self.condition:
+            queued = [job for job in self.heap if not job[2].cancelled()]
+            return {
+                "queued": len(queued),
+                "queued_idle": sum(1 for job in queued if job[0] >= Priority.IDLE),
+                "workers": len(self.threads),
+            }
+
+    def shutdown(self):
+        """Cancel queued jobs and let the workers exit after their current job."""
+        with self.condition:
+            self.stopping = True
+            for job in self.heap:
+                job[2].cancel()
+            self.heap.clear()
+            self.pending.clear()
+            self.condition.notify_all()
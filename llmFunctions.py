@@ -1,16 +1,26 @@
-import json, re
+import re
 from typing import List, Dict, Optional, Generator, Union
-import requests
 from dataclasses import dataclass, asdict
 from enum import Enum
 from datetime import datetime
-import ollama
 import traceback
 from dataclasses import dataclass, field
 import uuid, logging
-import asyncio, threading
-from typing import AsyncGenerator
-import os
+import threading
+from typing import AsyncGenerator, TYPE_CHECKING
+import os, html, queue, time, sys
+from collections import OrderedDict
+from contextManager import ContextBuilder, ContextWindow
+from sessions import SessionManager
+from scheduler import GenerationScheduler, CancellationToken, GenerationCancelled, Priority
+from jobs import JobQueue
+from eventLoop import EventLoopThread
+from ollamaClient import OllamaHTTP
+from promptTemplates import PromptRegistry
+from modelCatalog import ModelCatalog, ModelInfo
+
+if TYPE_CHECKING:
+    import ollama  # Imported lazily at runtime, see _async_ollama
 
 class MessageRole(Enum):
     SYSTEM = "system"
@@ -19,12 +29,36 @@ class MessageRole(Enum):
     FUNCTION = "function"
 
 
-@dataclass
+def _now_ms() -> int:
+    return time.time_ns() // 1_000_000
+
+
+@dataclass(slots=True)
 class Message:
+    """
+    One chat message. Every message of every loaded chat stays in memory, so messages have no
+    __dict__, keep their time as an int and share one string per distinct name.
+    """
     role: MessageRole
     content: str
     name: Optional[str] = None
-    timestamp: datetime = field(default_factory=datetime.now)
+    created_ms: int = field(default_factory=_now_ms)  # Unix time in milliseconds
+    id: Optional[int] = None  # Row id assigned by the chat store
+    token_count: Optional[int] = field(default=None, repr=False, compare=False)  # Cached by ContextBuilder
+    summary_of: Optional[int] = None  # For history summaries: id of the last message the summary replaces
+
+    def __post_init__(self):
+        if self.name is not None:
+            self.name = sys.intern(self.name)
+
+    @property
+    def timestamp(self) -> datetime:
+        """The creation time as a local datetime."""
+        return datetime.fromtimestamp(self.created_ms / 1000)
+
+    @timestamp.setter
+    def timestamp(self, value: datetime):
+        self.created_ms = round(value.timestamp() * 1000)
 
 @dataclass
 class Chat:
@@ -37,55 +71,307 @@ class Chat:
     system_prompt: Optional[str] = None
     model_name: str = "llama2"  # Default model
 
+    @classmethod
+    def from_dict(cls, chat_dict: dict) -> "Chat":
+        """Build a chat from a stored chat dict (a chat store row with its messages)."""
+        return cls(
+            id=chat_dict["id"],
+            type=chat_dict["type"],
+            title=chat_dict["title"],
+            created_at=datetime.fromisoformat(chat_dict["created_at"]),
+            last_message_at=datetime.fromisoformat(chat_dict["last_message_at"]),
+            system_prompt=chat_dict["system_prompt"],
+            model_name=chat_dict.get("model_name", "llama2"),
+            messages=[
+                Message(
+                    role=MessageRole(msg["role"]),
+                    content=msg["content"],
+                    name=msg["name"],
+                    created_ms=round(datetime.fromisoformat(msg["timestamp"]).timestamp() * 1000),
+                    id=msg.get("id"),
+                    summary_of=msg.get("summary_of")
+                )
+                for msg in chat_dict["messages"]
+            ]
+        )
+
+@dataclass
+class ChatSummary:
+    """What the chat lists need to know about a chat, without its messages."""
+    id: str
+    type: str
+    title: str
+    created_at: datetime
+    last_message_at: datetime
+    message_count: int = 0
+
+    @classmethod
+    def from_chat(cls, chat: Chat) -> "ChatSummary":
+        return cls(
+            id=chat.id,
+            type=chat.type,
+            title=chat.title,
+            created_at=chat.created_at,
+            last_message_at=chat.last_message_at,
+            message_count=len(chat.messages)
+        )
+
+@dataclass
+class SearchResult:
+    chat: ChatSummary
+    snippet: Optional[str] = None  # HTML excerpt with the matches wrapped in <mark>
+
+class EmbeddingIndexer:
+    """Embeds messages through Ollama on a background thread and answers similarity queries."""
+
+    def __init__(self, index, store, http: OllamaHTTP, model_name: str = "nomic-embed-text", batch_size: int = 32,
+                 batch_delay: float = 0.5):
+        """
+        :param index: The VectorIndex the embeddings are appended to.
+        :param store: The ChatStore used to backfill messages that were never embedded.
+        :param http: The OllamaHTTP client the embedding requests go through.
+        :param model_name: The Ollama embedding model.
+        :param batch_size: The maximum number of messages embedded per request.
+        :param batch_delay: How long to wait for more messages before embedding a partial batch.
+        """
+        self.index = index
+        self.store = store
+        self.http = http
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.queue: queue.Queue = queue.Queue()
+        self.last_id = 0
+        self.failing = False
+        self.thread = threading.Thread(target=self._run, daemon=True, name="embedding-indexer")
+
+    def start(self):
+        self.thread.start()
+
+    def enqueue(self, message: Message):
+        """Queue a stored message for embedding. Never blocks the caller."""
+        if message.id is not None and message.role != MessageRole.SYSTEM and message.content.strip():
+            self.queue.put((message.id, message.content))
+
+    def forget(self, message_ids: List[int]):
+        """Queue the removal of deleted messages' embeddings. Never blocks the caller."""
+        if message_ids:
+            self.queue.put((None, list(message_ids)))
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        return self.http.embed(self.model_name, texts)
+
+    def _index(self, batch: list) -> bool:
+        batch = [(message_id, text) for message_id, text in batch if message_id > self.last_id]
+        if not batch:
+            return True
+        try:
+            vectors = self._embed([text for _, text in batch])
+        except Exception as e:
+            if not self.failing:
+                logging.warning(f"Embedding with {self.model_name} failed, semantic search is incomplete: {e}")
+            self.failing = True
+            return False
+        self.failing = False
+        if self.index.model != self.model_name or self.index.dim != len(vectors[0]):
+            self.index.reset(self.model_name, len(vectors[0]))
+        self.index.add([message_id for message_id, _ in batch], vectors)
+        self.last_id = batch[-1][0]
+        return True
+
+    def _backfill(self):
+        """Embed stored messages that are newer than the last indexed one."""
+        self.last_id = self.index.max_id() if self.index.model == self.model_name else 0
+        while True:
+            rows = self.store.messages_after(self.last_id, self.batch_size)
+            if not rows or not self._index([(row["id"], row["content"]) for row in rows]):
+                return
+
+    def _run(self):
+        self._backfill()
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.batch_delay
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            forgotten = [message_id for item_id, ids in batch if item_id is None for message_id in ids]
+            batch = [item for item in batch if item[0] is not None]
+            if self.failing:
+                # Messages dropped while Ollama was unreachable are still in the store
+                self._backfill()
+            self._index(batch)
+            if forgotten:
+                self.index.remove(forgotten)
+
+    def search(self, query: str, k: int = 10) -> List[tuple]:
+        """Return the k (message_id, score) pairs most similar to the query text."""
+        if len(self.index) == 0:
+            return []
+        return self.index.query(self._embed([query])[0], k)
+
 class Model:
-    def __init__(self, base_url: str = "http://localhost:11434", model_name: str = "llama2"):
+    def __init__(self, base_url: str = "http://localhost:11434", model_name: str = "llama2", store=None, max_loaded_chats: int = 16,
+                 context_builder: Optional[ContextBuilder] = None, sessions: Optional[SessionManager] = None,
+                 scheduler: Optional[GenerationScheduler] = None, jobs: Optional[JobQueue] = None,
+                 http: Optional[OllamaHTTP] = None, response_cache=None, prompts: Optional[PromptRegistry] = None,
+                 catalog: Optional[ModelCatalog] = None):
         self.base_url = base_url
+        self.store = store  # Optional ChatStore, mutations are persisted through it
         self.default_model_name = model_name
         self.current_chat: Optional[Chat] = None
-        self.chats: Dict[str, Chat] = {}
-        self.available_models = self._get_available_models()
-        self.stop_generation = False
-        print("Model initialized")
-
-    def _get_available_models(self) -> List[Dict[str, str]]:
-        try:
-            models_dict = ollama.list()
-            return [{"value": model.model, "label": model.model} for model in models_dict['models']]
-        except Exception:
-            return [{"value": "llama2", "label": "llama2"}]
+        # Chats whose messages are in memory, least recently used first. Without a store nothing can be evicted.
+        self.chats: Dict[str, Chat] = OrderedDict()
+        self.max_loaded_chats = max_loaded_chats
+        self.context_builder = context_builder or ContextBuilder()
+        self.sessions = sessions or SessionManager(context_size=self.context_builder.context_size)
+        self.last_context: Optional[ContextWindow] = None  # Token accounting of the latest request
+        self._compacting = set()  # Ids of chats with a summary being generated
+        self.summaries: Dict[str, ChatSummary] = {}
+        self._deleted = set()  # Ids of deleted chats, late saves (e.g. a title job) must not bring them back
+        self.indexer: Optional[EmbeddingIndexer] = None  # Set when semantic search is available
+        # The one pooled connection to Ollama for replies, plainGen and model listing
+        self.http = http or OllamaHTTP(base_url)
+        if self.sessions.http is None:
+            self.sessions.http = self.http
+        self.prompts = prompts or PromptRegistry()
+        self.response_cache = response_cache  # A data.ResponseCache for plainGen(cache=True), or None
+        # Installed models and their details, refreshed in the background once catalog.start() is called
+        self.catalog = catalog or ModelCatalog(self.http, fallback_model=self.default_model_name)
+        if self.context_builder.max_context_size is None:
+            self.context_builder.max_context_size = self.catalog.context_length
+        if self.sessions.catalog is None:
+            self.sessions.catalog = self.catalog
+        self.scheduler = scheduler or GenerationScheduler()
+        if self.scheduler.catalog is None:
+            self.scheduler.catalog = self.catalog
+        self.generations: Dict[str, CancellationToken] = {}  # Running replies by chat id
+        # Titles, summaries and prompt enhancement run here, behind the user's replies
+        self.jobs = jobs or JobQueue()
+        if self.jobs.is_busy is None:
+            self.jobs.is_busy = lambda: bool(self.generations)
+        # generate_async runs here, so every async request shares one client and its connection pool
+        self.event_loop = EventLoopThread()
+        self._async_client = None  # ollama.AsyncClient, created on first use
+        logging.info("Model initialized")
 
     def get_available_models(self) -> List[Dict[str, str]]:
-        return self.available_models
+        """The last known model list, never waits for Ollama."""
+        return self.catalog.available()
+
+    def get_model_info(self, model_name: str) -> Optional[ModelInfo]:
+        return self.catalog.get(model_name)
+
+    def load_summaries(self):
+        """(Re)build the in-memory chat summary index from the store."""
+        if not self.store:
+            self.summaries = {chat.id: ChatSummary.from_chat(chat) for chat in self.chats.values()}
+            return
+        self.summaries = {
+            row["id"]: ChatSummary(
+                id=row["id"],
+                type=row["type"],
+                title=row["title"],
+                created_at=datetime.fromisoformat(row["created_at"]),
+                last_message_at=datetime.fromisoformat(row["last_message_at"]),
+                message_count=row["message_count"]
+            )
+            for row in self.store.load_summaries()
+        }
+
+    def _update_summary(self, chat: Chat):
+        self.summaries[chat.id] = ChatSummary.from_chat(chat)
+
+    def get_chat_summaries(self) -> List[ChatSummary]:
+        return list(self.summaries.values())
+
+    def _remember(self, chat: Chat):
+        """Mark a chat as most recently used and evict the least recently used ones over the limit."""
+        self.chats[chat.id] = chat
+        self.chats.move_to_end(chat.id)
+        if not self.store:
+            return
+        for chat_id in list(self.chats.keys()):
+            if len(self.chats) <= self.max_loaded_chats:
+                break
+            if (self.current_chat and chat_id == self.current_chat.id) or chat_id in self.generations:
+                continue
+            del self.chats[chat_id]
+
+    def _load_chat(self, chat_id: str) -> Optional[Chat]:
+        """Return a chat with its messages, loading them from the store if they are not in memory."""
+        chat = self.chats.get(chat_id)
+        if chat is None and self.store:
+            chat_dict = self.store.load_chat(chat_id)
+            if chat_dict is not None:
+                chat = Chat.from_dict(chat_dict)
+        if chat is not None:
+            self._remember(chat)
+        return chat
 
-    async def generate_async(self, prompt: str, stream: bool = True, add_to_history: bool = True) -> AsyncGenerator[str, None]:
-        """
-        Asynchronously generate response chunks by running the blocking generate() method in a background thread.
-        Yields each chunk as it becomes available.
+    def _async_ollama(self) -> "ollama.AsyncClient":
+        """The shared async client, created on first use inside the event loop."""
+        if self._async_client is None:
+            import ollama  # Imported on first use, it is slow to import and not needed at startup
+            self._async_client = ollama.AsyncClient(host=self.base_url)
+        return self._async_client
+
+    async def generate_async(self, prompt: str, stream: bool = True, add_to_history: bool = True, chat_id: Optional[str] = None) -> AsyncGenerator[str, None]:
         """
-        loop = asyncio.get_running_loop()
-        queue: asyncio.Queue = asyncio.Queue()
-
-        def run_blocking_generation():
-            try:
-                # Iterate over the blocking generator and put chunks into the queue.
-                for chunk in self.generate(prompt, stream, add_to_history):
-                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
-            except Exception as e:
-                loop.call_soon_threadsafe(queue.put_nowait, f"<ERROR>{str(e)}</ERROR>")
-            # Signal completion.
-            loop.call_soon_threadsafe(queue.put_nowait, None)
-
-        # Start the blocking generation in a background thread.
-        threading.Thread(target=run_blocking_generation, daemon=True).start()
-
-        # Yield chunks as they arrive.
-        while True:
-            chunk = await queue.get()
-            if chunk is None:
-                break
-            yield chunk
+        Stream a reply like generate(), natively on asyncio. Must be consumed on self.event_loop.
 
-    def generate_title(self, conversation_history: list, previous_title: str = None) -> str:
+        Chunks are only read from Ollama as fast as the consumer takes them. Closing the generator,
+        cancelling its task or stop_generating() closes the request. Errors are raised, not yielded.
+        """
+        chat, token, messages, timing = self._begin_generation(prompt, add_to_history, chat_id)
+        model_name = chat.model_name
+        try:
+            async with self.scheduler.async_slot(model_name, token):
+                response = await self._async_ollama().chat(
+                    model=model_name,
+                    messages=messages,
+                    stream=stream,
+                    **self.sessions.request_args(model_name)
+                )
+                if not stream:
+                    response = self._single_chunk(response)
+
+                full_response = []
+                try:
+                    async for chunk in response:
+                        if token.cancelled:
+                            break
+                        if chunk.get('done'):
+                            timing.add_counters(chunk)
+
+                        content = chunk.get('message', {}).get('content', '')
+                        if content:
+                            if timing.first_token is None:
+                                timing.first_token = time.monotonic()
+                            full_response.append(content)
+                            yield content
+                finally:
+                    if stream:
+                        await response.aclose()  # Drops the HTTP stream if we stopped early
+
+            if add_to_history and full_response:  # Nothing to keep if stopped before the first token
+                self.add_message(MessageRole.ASSISTANT, "".join(full_response), chat=chat)
+
+        except GenerationCancelled:
+            logging.info(f"Generation for chat {chat.id} cancelled while queued")
+        finally:
+            self._end_generation(chat, token, timing)
+
+    @staticmethod
+    async def _single_chunk(response):
+        yield response
+
+    def generate_title(self, conversation_history: list, previous_title: str = None, model_name: Optional[str] = None) -> str:
         """
         Generate a context-aware title for the conversation
         Returns the generated title or existing title if no change needed
@@ -112,7 +398,7 @@ Format: Always output the title in this exact format:
 [Current Title: "Your Generated Title Here"]'''
 
         try:
-            response = self.plainGen(prompt).response
+            response = self.plainGen(prompt, model_name, cache=True).response
             match = re.search(r'\[Current Title: "(.*?)"\]', response)
             if match:
                 return match.group(1)
@@ -121,12 +407,33 @@ Format: Always output the title in this exact format:
             logging.error(f"Title generation failed: {str(e)}")
             return previous_title or "New Conversation"
 
-    def plainGen(self, prompt:str) -> ollama.GenerateResponse:
-        response = ollama.generate(
-            model=self.current_chat.model_name,
-            prompt=prompt
-        )
-        return response
+    def plainGen(self, prompt:str, model_name: Optional[str] = None, priority: int = Priority.BACKGROUND,
+                 cache: bool = False) -> "ollama.GenerateResponse":
+        """
+        Generate a single answer without chat history.
+
+        :param cache: Reuse the answer to an identical earlier request (same model, prompt and options).
+        """
+        import ollama
+        model_name = model_name or self.current_chat.model_name
+        request_args = self.sessions.request_args(model_name)
+        key = None
+        if cache and self.response_cache is not None:
+            key = self.response_cache.key(model_name, prompt, request_args["options"])
+            cached = self.response_cache.get(key)
+            if cached is not None:
+                return ollama.GenerateResponse(**cached)
+        # Shares the model's slots with chat replies, which are served first
+        with self.scheduler.slot(model_name, priority=priority):
+            response = self.http.generate(
+                model=model_name,
+                prompt=prompt,
+                **request_args
+            )
+        if key is not None:
+            response.pop("context", None)  # The prompt's token ids, large and never reused
+            self.response_cache.put(key, response)
+        return ollama.GenerateResponse(**response)
 
     def create_chat(self, chat_type: str, model_name: Optional[str] = None) -> Chat:
         if model_name is None:
@@ -135,7 +442,7 @@ Format: Always output the title in this exact format:
         # Create a system prompt message as a Message instance
         system_message = Message(
             role=MessageRole.SYSTEM,
-            content=f"This is a system prompt. {self._get_system_prompt(chat_type)}"
+            content=f"This is a system prompt. {self._get_system_prompt(chat_type, model_name)}"
         )
         chat = Chat(
             id=chat_id,
@@ -146,31 +453,46 @@ Format: Always output the title in this exact format:
             messages=[system_message],
             model_name=model_name
         )
-        self.chats[chat_id] = chat
+        if self.store:
+            self.store.add_chat(chat)
         self.current_chat = chat
-        print(f"Created new chat: {chat_id} - {chat.title}")
+        self._remember(chat)
+        self._update_summary(chat)
+        logging.info(f"Created new chat: {chat_id} - {chat.title}")
         return chat
 
-    def _get_system_prompt(self, chat_type: str) -> str:
-        system_prompts = {}
-        print(f'....{os.getcwd()}....')
-        for file in os.listdir('prompts'):
-            if file.startswith('system.') and file.endswith('.txt'):
-                systemPromptKey = file.replace('system.', '').replace('.txt', '')
-                systemPromptContent = open(os.path.join('prompts', file), 'rb').read().decode()
-                system_prompts.update({systemPromptKey: systemPromptContent})
-        return system_prompts.get(chat_type, system_prompts["general"])
-
-    def add_message(self, role: MessageRole, content: str, name: Optional[str] = None):
+    def _get_system_prompt(self, chat_type: str, model_name: Optional[str] = None) -> str:
+        return self.prompts.render(
+            chat_type,
+            chat_type=chat_type,
+            model_name=model_name or self.default_model_name,
+            username=os.getenv("username", ""),
+            date=datetime.now().strftime("%Y-%m-%d")
+        )
+
+    def _store_message(self, chat: Chat, message: Message):
+        """Persist a message that was just appended to chat.messages."""
+        if self.store:
+            self.store.add_message(chat, message)
+        self._update_summary(chat)
+        if self.indexer:
+            self.indexer.enqueue(message)
+
+    def add_message(self, role: MessageRole, content: str, name: Optional[str] = None, chat: Optional[Chat] = None):
         try:
-            if not self.current_chat:
+            chat = chat or self.current_chat
+            if not chat:
                 raise Exception("No active chat")
+            if chat.id in self._deleted:
+                logging.debug(f"Not adding a message to deleted chat {chat.id}")
+                return  # e.g. the end of a reply that was stopped by deleting its chat
             message = Message(role=role, content=content, name=name)
-            self.current_chat.messages.append(message)
-            self.current_chat.last_message_at = datetime.now()
-            if role == MessageRole.USER and self.current_chat.title.startswith("New Chat"):
-                self.current_chat.title = content[:50] + "..." if len(content) > 50 else content
-            print(f"Added message to chat {self.current_chat.id}")
+            chat.messages.append(message)
+            chat.last_message_at = datetime.now()
+            if role == MessageRole.USER and chat.title.startswith("New Chat"):
+                chat.title = content[:50] + "..." if len(content) > 50 else content
+            self._store_message(chat, message)
+            logging.debug(f"Added message to chat {chat.id}")
         except Exception as e:
             print(f"Error adding message: {str(e)}")
             traceback.print_exc()
@@ -184,8 +506,13 @@ Format: Always output the title in this exact format:
                 index = len(self.current_chat.messages) + index
             if index < 0 or index >= len(self.current_chat.messages):
                 raise Exception("Invalid message index")
-            del self.current_chat.messages[index]
-            print(f"Removed message from chat {self.current_chat.id}")
+            message = self.current_chat.messages.pop(index)
+            if self.store and message.id is not None:
+                self.store.delete_message(message.id)
+            if self.indexer and message.id is not None:
+                self.indexer.forget([message.id])
+            self._update_summary(self.current_chat)
+            logging.debug(f"Removed message from chat {self.current_chat.id}")
         except Exception as e:
             print(f"Error removing message: {str(e)}")
             traceback.print_exc()
@@ -194,18 +521,16 @@ Format: Always output the title in this exact format:
     def strip_thinking(self, response: str) -> str:
         return re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL).strip()
 
-    def get_chat(self, chat_id: str) -> Optional[Chat]:
+    def get_chat(self, chat_id: str, make_current: bool = True) -> Optional[Chat]:
         try:
-            print(f"Looking up chat with ID: {chat_id}")
-            print(f"Available chat IDs: {list(self.chats.keys())}")
-            chat = self.chats.get(chat_id)
+            chat = self._load_chat(chat_id)
             if chat:
-                print(f"Found chat: {chat_id} - {chat.title}")
-                print(f"Number of messages: {len(chat.messages)}")
-                self.current_chat = chat
+                logging.debug(f"Found chat {chat_id} ({len(chat.messages)} messages)")
+                if make_current:
+                    self.current_chat = chat
                 return chat
             else:
-                print(f"Chat not found: {chat_id}")
+                logging.debug(f"Chat not found: {chat_id}")
                 return None
         except Exception as e:
             print(f"Error getting chat: {str(e)}")
@@ -215,45 +540,89 @@ Format: Always output the title in this exact format:
     def get_all_chats(self) -> List[Chat]:
         try:
             chats = list(self.chats.values())
-            print(f"Retrieved {len(chats)} chats")
+            logging.debug(f"Retrieved {len(chats)} chats")
             return chats
         except Exception as e:
             print(f"Error getting all chats: {str(e)}")
             traceback.print_exc()
             return []
 
-    def search_chats(self, query: str) -> List[Chat]:
+    def search_chats(self, query: str) -> List[SearchResult]:
+        """Search chat titles and messages, best match first."""
+        if self.store:
+            return [
+                SearchResult(self.summaries[chat_id], snippet)
+                for chat_id, snippet in self.store.search(query)
+                if chat_id in self.summaries
+            ]
         query = query.lower()
         results = []
         for chat in self.chats.values():
             if query in chat.title.lower():
-                results.append(chat)
+                results.append(SearchResult(self.summaries[chat.id]))
             else:
                 for msg in chat.messages:
                     if query in msg.content.lower():
-                        results.append(chat)
+                        results.append(SearchResult(self.summaries[chat.id]))
                         break
         return results
 
+    def find_similar_chats(self, query: str, k: int = 10) -> List[SearchResult]:
+        """Find the chats whose messages are semantically closest to the query, best first."""
+        if not self.indexer or not self.store:
+            return []
+        hits = self.indexer.search(query, k * 5)
+        messages = self.store.get_messages([message_id for message_id, _ in hits])
+        results = {}
+        for message_id, _ in hits:
+            message = messages.get(message_id)
+            if message is None or message["chat_id"] in results or message["chat_id"] not in self.summaries:
+                continue
+            content = message["content"]
+            snippet = html.escape(content[:120]) + ("…" if len(content) > 120 else "")
+            results[message["chat_id"]] = SearchResult(self.summaries[message["chat_id"]], snippet)
+            if len(results) >= k:
+                break
+        return list(results.values())
+
     def delete_chat(self, chat_id: str):
         try:
-            if chat_id in self.chats:
-                print(f"Deleting chat: {chat_id}")
-                del self.chats[chat_id]
+            if chat_id in self.chats or chat_id in self.summaries:
+                logging.info(f"Deleting chat: {chat_id}")
+                self._deleted.add(chat_id)
+                self.chats.pop(chat_id, None)
+                self.summaries.pop(chat_id, None)
+                if self.store and self.indexer:
+                    self.indexer.forget(self.store.message_ids(chat_id))
+                for kind in ("title", "enhance", "compact"):
+                    self.jobs.cancel((kind, chat_id))
+                self._compacting.discard(chat_id)
+                self.stop_generating(chat_id)
+                if self.store:
+                    self.store.delete_chat(chat_id)
                 if self.current_chat and self.current_chat.id == chat_id:
                     self.current_chat = None
             else:
-                print(f"Chat {chat_id} not found for deletion")
+                logging.warning(f"Chat {chat_id} not found for deletion")
         except Exception as e:
             print(f"Error deleting chat: {str(e)}")
             traceback.print_exc()
             raise
 
+    def save_chat(self, chat: Chat):
+        """Persist a chat's metadata after it was changed outside of add_message (e.g. a new title)."""
+        if chat.id in self._deleted:
+            return
+        if self.store:
+            self.store.save_chat(chat)
+        self._update_summary(chat)
+
     def set_current_chat(self, chat_id: str):
         try:
-            if chat_id in self.chats:
-                self.current_chat = self.chats[chat_id]
-                print(f"Set current chat to: {chat_id} - {self.current_chat.title}")
+            chat = self._load_chat(chat_id)
+            if chat:
+                self.current_chat = chat
+                logging.debug(f"Set current chat to: {chat_id}")
             else:
                 raise Exception(f"Chat with ID {chat_id} not found")
         except Exception as e:
@@ -264,88 +633,170 @@ Format: Always output the title in this exact format:
     def clear_current_chat(self):
         self.current_chat = None
 
-    def _prepare_messages(self) -> List[Dict]:
-        if not self.current_chat:
+    @staticmethod
+    def _leading_system_count(messages: List[Message]) -> int:
+        count = 0
+        while count < len(messages) and messages[count].role == MessageRole.SYSTEM:
+            count += 1
+        return count
+
+    def _effective_history(self, messages: List[Message]) -> List[Message]:
+        """The history as it is sent: turns covered by the latest summary are replaced by that summary."""
+        summary = next((message for message in reversed(messages) if message.summary_of is not None), None)
+        if summary is None:
+            return messages
+        cutoff = next((index for index, message in enumerate(messages) if message.id == summary.summary_of), None)
+        if cutoff is None:
+            # The summarized turns were deleted, the summary no longer applies
+            return [message for message in messages if message.summary_of is None]
+        head = messages[:self._leading_system_count(messages)]
+        rest = [message for message in messages[cutoff + 1:] if message.summary_of is None]
+        return head + [summary] + rest
+
+    def maybe_compact(self, chat: Chat, threshold_tokens: int = 3000, keep_recent: int = 6) -> bool:
+        """
+        Summarize older turns in the background once the unsummarized history grows past the threshold.
+
+        :param chat: The chat to compact.
+        :param threshold_tokens: Unsummarized history size (in estimated tokens) that triggers a summary.
+        :param keep_recent: How many of the newest messages are always sent verbatim.
+        :return: True if a summary is being generated.
+        """
+        if chat.id in self._compacting:
+            return False
+        history = self._effective_history(chat.messages)
+        head = self._leading_system_count(history)
+        turns = history[head:]
+        if len(turns) <= keep_recent:
+            return False
+        if sum(self.context_builder.count_tokens(message) for message in turns) < threshold_tokens:
+            return False
+        to_summarize = turns[:-keep_recent]
+        if to_summarize[-1].id is None:
+            return False  # Summaries reference stored messages
+        previous = history[head - 1] if head and history[head - 1].summary_of is not None else None
+        self._compacting.add(chat.id)
+        self.jobs.submit(self._compact, chat, previous, to_summarize, priority=Priority.BACKGROUND, key=("compact", chat.id))
+        return True
+
+    def _compact(self, chat: Chat, previous: Optional[Message], to_summarize: List[Message]):
+        try:
+            transcript = "\n\n".join(f"{message.role.value}: {message.content}" for message in to_summarize)
+            prompt = (
+                "Summarize the conversation below so the summary can replace it as context for continuing the chat. "
+                "Keep facts, decisions, names, code identifiers and open questions. "
+                "Return only the summary.\n\n"
+                + (f"Summary of the conversation before this part:\n{previous.content}\n\n" if previous else "")
+                + f"Conversation:\n{transcript}"
+            )
+            summary = self.strip_thinking(self.plainGen(prompt, chat.model_name).response)
+            if chat.id in self._deleted:
+                return  # Deleted while the summary was generated
+            message = Message(
+                role=MessageRole.SYSTEM,
+                content=f"Summary of the earlier conversation:\n{summary}",
+                summary_of=to_summarize[-1].id
+            )
+            chat.messages.append(message)
+            self._store_message(chat, message)
+            logging.info(f"Compacted {len(to_summarize)} messages of chat {chat.id}")
+        except Exception as e:
+            logging.error(f"History compaction failed for chat {chat.id}: {e}", exc_info=True)
+        finally:
+            self._compacting.discard(chat.id)
+
+    def _prepare_messages(self, chat: Optional[Chat] = None) -> List[Dict]:
+        """Fit a chat's history, with old turns replaced by their summary, into the context budget."""
+        chat = chat or self.current_chat
+        if not chat:
             raise Exception("No active chat")
-        messages = []
-        if self.current_chat.system_prompt:
-            messages.append({
-                "role": MessageRole.SYSTEM.value,
-                "content": self.current_chat.system_prompt
-            })
-        for msg in self.current_chat.messages:
-            message_dict = {
-                "role": msg.role.value,
-                "content": msg.content
-            }
-            if msg.name:
-                message_dict["name"] = msg.name
-            messages.append(message_dict)
-        print(messages)
-        return messages
-
-    def generate(self, prompt: str, stream: bool = True, add_to_history: bool = True) -> Generator[str, None, None]:
-        from functions import _save_chats
-        
-        if not self.current_chat:
+        window = self.context_builder.build(
+            self._effective_history(chat.messages),
+            chat.model_name,
+            system_prompt=chat.system_prompt,
+            key=chat.id
+        )
+        self.last_context = window
+        logging.debug(f"Prepared {len(window.messages)} messages ({window.tokens} tokens): {window.messages}")
+        return window.messages
+
+    def stop_generating(self, chat_id: Optional[str] = None):
+        """Cancel the reply being generated in a chat, or every running reply if no chat is given."""
+        for generating_chat_id, token in list(self.generations.items()):
+            if chat_id is None or generating_chat_id == chat_id:
+                token.cancel()
+
+    def is_generating(self, chat_id: str) -> bool:
+        return chat_id in self.generations
+
+    def _begin_generation(self, prompt: str, add_to_history: bool, chat_id: Optional[str]):
+        chat = self._load_chat(chat_id) if chat_id else self.current_chat
+        if not chat:
             raise Exception("No active chat")
         
-        self.stop_generation = False
-
         if add_to_history:
-            self.add_message(MessageRole.USER, prompt)
-        
-        messages = self._prepare_messages()
+            self.add_message(MessageRole.USER, prompt, chat=chat)
+        messages = self._prepare_messages(chat)
+
+        # A new reply in the same chat supersedes the one still running
+        token = CancellationToken()
+        previous = self.generations.get(chat.id)
+        if previous:
+            previous.cancel()
+        self.generations[chat.id] = token
+        timing = self.sessions.start_request(chat.model_name, chat.id)
+        return chat, token, messages, timing
+
+    def _end_generation(self, chat: Chat, token: CancellationToken, timing):
+        self.sessions.finish_request(timing)
+        if self.generations.get(chat.id) is token:
+            del self.generations[chat.id]
+
+    def generate(self, prompt: str, stream: bool = True, add_to_history: bool = True, chat_id: Optional[str] = None) -> Generator[str, None, None]:
+        chat, token, messages, timing = self._begin_generation(prompt, add_to_history, chat_id)
+        model_name = chat.model_name
         
         try:
-            response = ollama.chat(
-                model=self.current_chat.model_name,
-                messages=messages,
-                stream=stream
-            )
-            
-            full_response = ""
-            for chunk in response:
-                if self.stop_generation:
-                    break
+            with self.scheduler.slot(model_name, token):
+                response = self.http.chat(
+                    model=model_name,
+                    messages=messages,
+                    stream=stream,
+                    **self.sessions.request_args(model_name)
+                )
                 
-                content = chunk.get('message', {}).get('content', '')
-                if content:
-                    full_response += content
-                    yield content
+                full_response = []
+                for chunk in (response if stream else [response]):
+                    if token.cancelled:
+                        break
+                    if chunk.get('done'):
+                        timing.add_counters(chunk)
+                    
+                    content = chunk.get('message', {}).get('content', '')
+                    if content:
+                        if timing.first_token is None:
+                            timing.first_token = time.monotonic()
+                        full_response.append(content)
+                        yield content
             
-            # Only save if not stopped
-            if not self.stop_generation and add_to_history:
-                self.add_message(MessageRole.ASSISTANT, full_response)
-            elif add_to_history:  # Save partial response if stopped
-                self.add_message(MessageRole.ASSISTANT, full_response)
-                _save_chats()
+            # add_message persists the reply, partial if generation was stopped
+            if add_to_history and full_response:  # Nothing to keep if stopped before the first token
+                self.add_message(MessageRole.ASSISTANT, "".join(full_response), chat=chat)
                 
+        except GenerationCancelled:
+            logging.info(f"Generation for chat {chat.id} cancelled while queued")
         except Exception as e:
             yield f"<ERROR>{str(e)}</ERROR>"
+        finally:
+            self._end_generation(chat, token, timing)
 
     def _stream_response(self, data: Dict) -> Generator[str, None, None]:
-        response = requests.post(
-            f"{self.base_url}/api/chat",
-            json=data,
-            stream=True
-        )
-        if response.status_code != 200:
-            raise Exception(f"Ollama API error: {response.text}")
-        for line in response.iter_lines():
-            if line:
-                chunk = json.loads(line)
-                if "message" in chunk and "content" in chunk["message"]:
-                    yield chunk["message"]["content"]
+        for chunk in self.http.stream("/api/chat", data):
+            if "message" in chunk and "content" in chunk["message"]:
+                yield chunk["message"]["content"]
 
     def _get_complete_response(self, data: Dict) -> str:
-        response = requests.post(
-            f"{self.base_url}/api/chat",
-            json=data
-        )
-        if response.status_code != 200:
-            raise Exception(f"Ollama API error: {response.text}")
-        result = response.json()
+        result = self.http.request("/api/chat", dict(data, stream=False))
         if "message" in result and "content" in result["message"]:
             return result["message"]["content"]
         return ""
@@ -1,16 +1,16 @@
-import eel
-import webview
+from startup import timer  # First, so the startup report covers the imports below
 import time
 import socket
 import sys
 import os
 import threading
 import traceback
-from functions import functionsList
+with timer.phase("import eel"):
+    import eel
 from data import Config
 import shared
 
-config = Config("kosmos.chat", load_on_get=True)
+config = Config.instance("kosmos.chat", load_on_get=True)
 
 class Application:
     class properties:
@@ -24,11 +24,18 @@ class Application:
         minimized = False
         host = '127.0.0.1'
         port = 8000
+        server_timeout = 10  # Seconds to wait for the Eel server to listen
 
     def __init__(self) -> None:
         self.validate_structure()
         shared.app = self
-        eel.init(self.properties.web_folder)
+        self.server_ready = threading.Event()
+        with timer.phase("import functions"):
+            from functions import functionsList, start_background_tasks, page_closed
+        self.start_background_tasks = start_background_tasks
+        self.page_closed = page_closed
+        with timer.phase("eel.init"):
+            eel.init(self.properties.web_folder)
         for func in functionsList:
             eel.expose(func)
 
@@ -51,22 +58,45 @@ class Application:
                 host=self.properties.host,
                 port=self.properties.port,
                 block=True,
-                shutdown_delay=5
+                shutdown_delay=5,
+                # The process ends with the window, so Eel's own shutdown detection is not needed
+                close_callback=self.page_closed
             )
         except Exception as e:
             traceback.print_exc()
             print(f"🔥 Eel server failed to start: {str(e)}")
             sys.exit(1)
 
+    def watch_server(self, eel_thread: threading.Thread):
+        """Set server_ready as soon as the Eel server accepts connections."""
+        deadline = time.monotonic() + self.properties.server_timeout
+        while eel_thread.is_alive() and time.monotonic() < deadline:
+            if not self.is_port_available():
+                timer.mark("server listening")
+                self.server_ready.set()
+                return
+            time.sleep(0.01)
+
+    def on_window_started(self):
+        timer.mark("window shown")
+        timer.log()
+
     def start(self):
         properties = self.properties
         if not self.is_port_available():
             print(f"⚠️ Port {properties.port} is already in use!")
             sys.exit(1)
         print("🚀 Starting Eel server on a separate thread (blocking mode)...")
-        eel_thread = threading.Thread(target=self.start_eel_server, daemon=True)
+        eel_thread = threading.Thread(target=self.start_eel_server, daemon=True, name="eel")
         eel_thread.start()
-        time.sleep(2)
+        threading.Thread(target=self.watch_server, args=(eel_thread,), daemon=True, name="eel-ready").start()
+        self.start_background_tasks()
+        # Load the GUI toolkit while the server comes up
+        with timer.phase("import webview"):
+            import webview
+        if not self.server_ready.wait(properties.server_timeout):
+            print(f"🔥 Eel server did not start listening within {properties.server_timeout}s")
+            sys.exit(1)
         print("🪟 Creating application window...")
         try:
             webview.create_window(
@@ -79,7 +109,7 @@ class Application:
                 frameless=properties.frameless,
                 minimized=properties.minimized
             )
-            webview.start()
+            webview.start(self.on_window_started)
         except Exception as e:
             print(f"💥 Window creation failed: {str(e)}")
             sys.exit(1)
@@ -0,0 +1,106 @@
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional, Sequence
+import threading
+import time
+
+
+def _exponential_bounds(start: float, factor: float, count: int) -> tuple:
+    return tuple(round(start * factor ** i, 3) for i in range(count))
+
+
+# Bucket upper bounds; the last bucket takes everything above them
+MILLISECONDS = _exponential_bounds(1, 2, 16)        # 1 ms .. ~33 s
+BYTES = _exponential_bounds(256, 4, 10)             # 256 B .. 64 MB
+RATE = _exponential_bounds(1, 1.5, 14)              # 1 .. ~190 per second
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets, plus the most recent samples for exact percentiles.
+
+    Recording is a bisect and two appends under a lock, cheap enough for every streamed reply.
+    """
+
+    def __init__(self, name: str, unit: str, bounds: Sequence[float] = MILLISECONDS, window: int = 512):
+        """
+        :param unit: Shown next to the values, e.g. "ms".
+        :param bounds: Ascending bucket upper bounds.
+        :param window: How many recent samples the percentiles are computed from.
+        """
+        self.name = name
+        self.unit = unit
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.recent = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self.lock:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.recent.append(value)
+            self.count += 1
+            self.total += value
+            self.min = value if self.min is None else min(self.min, value)
+            self.max = value if self.max is None else max(self.max, value)
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            recent = sorted(self.recent)
+            snapshot = {
+                "unit": self.unit,
+                "count": self.count,
+                "avg": round(self.total / self.count, 2) if self.count else None,
+                "min": round(self.min, 2) if self.min is not None else None,
+                "max": round(self.max, 2) if self.max is not None else None,
+                "buckets": [
+                    {"le": bound, "count": count}
+                    for bound, count in zip(self.bounds + (None,), self.counts)
+                    if count
+                ],
+            }
+        for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+            snapshot[name] = round(recent[min(len(recent) - 1, int(len(recent) * fraction))], 2) if recent else None
+        return snapshot
+
+
+class Metrics:
+    """Named histograms for the hot paths, created on first use."""
+
+    def __init__(self):
+        self.histograms: Dict[str, Histogram] = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name: str, unit: str = "ms", bounds: Sequence[float] = MILLISECONDS) -> Histogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(name, Histogram(name, unit, bounds))
+        return histogram
+
+    def observe(self, name: str, value: float, unit: str = "ms", bounds: Sequence[float] = MILLISECONDS):
+        self.histogram(name, unit, bounds).observe(value)
+
+    @contextmanager
+    def time(self, name: str):
+        """Record how long the with-block took, in milliseconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - start) * 1000)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {name: histogram.snapshot() for name, histogram in sorted(self.histograms.items())}
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+
+metrics = Metrics()
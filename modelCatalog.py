@@ -0,0 +1,157 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+import threading
+import logging
+import time
+
+
+@dataclass
+class ModelInfo:
+    """What Ollama reports about an installed model."""
+    name: str
+    digest: Optional[str] = None
+    size: Optional[int] = None               # Bytes on disk
+    family: Optional[str] = None
+    parameter_size: Optional[str] = None     # e.g. "8.0B"
+    quantization: Optional[str] = None       # e.g. "Q4_K_M"
+    context_length: Optional[int] = None     # The longest context the model was trained for
+    loaded: bool = False
+    size_vram: Optional[int] = None          # Bytes in GPU memory while loaded
+    expires_at: Optional[str] = None         # When Ollama unloads it, while loaded
+
+    def to_dict(self) -> Dict:
+        return dict(self.__dict__)
+
+
+class ModelCatalog:
+    """
+    The installed models and their details, refreshed in the background.
+
+    Readers always get the last known state without waiting for Ollama. Details from /api/show
+    are fetched once per model version (digest), the loaded state from /api/ps on every refresh.
+    """
+
+    def __init__(self, http, refresh_interval: float = 60.0, fallback_model: str = "llama2"):
+        """
+        :param http: The OllamaHTTP client.
+        :param refresh_interval: Seconds between background refreshes, 0 refreshes on request only.
+        :param fallback_model: Listed while no model is known, e.g. because Ollama is not running.
+        """
+        self.http = http
+        self.refresh_interval = refresh_interval
+        self.fallback_model = fallback_model
+        self.models: Dict[str, ModelInfo] = {}
+        self.ready = threading.Event()  # Set after the first refresh, successful or not
+        self.reachable = False
+        self.refreshed_at: Optional[float] = None
+        self._refresh_requested = threading.Event()
+        self._refresh_lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Refresh now and then every refresh_interval seconds, on a background thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="model-catalog")
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self.refresh()
+            self._refresh_requested.wait(self.refresh_interval or None)
+            self._refresh_requested.clear()
+
+    def request_refresh(self):
+        """Refresh soon without waiting for it, e.g. after a model was pulled."""
+        if self._thread is None:
+            threading.Thread(target=self.refresh, daemon=True, name="model-catalog-refresh").start()
+        else:
+            self._refresh_requested.set()
+
+    def refresh(self):
+        with self._refresh_lock:
+            started = time.monotonic()
+            try:
+                tags = self.http.list_models()
+            except Exception as e:
+                if self.reachable or not self.ready.is_set():
+                    logging.warning(f"Could not list Ollama models, keeping the last known list: {e}")
+                self.reachable = False
+                self.ready.set()
+                return
+            try:
+                running = {model["model"]: model for model in self.http.running_models()}
+            except Exception as e:
+                logging.warning(f"Could not get the loaded Ollama models: {e}")
+                running = {}
+
+            models = {}
+            for tag in tags:
+                name = tag["model"]
+                details = tag.get("details") or {}
+                known = self.models.get(name)
+                info = ModelInfo(
+                    name=name,
+                    digest=tag.get("digest"),
+                    size=tag.get("size"),
+                    family=details.get("family"),
+                    parameter_size=details.get("parameter_size"),
+                    quantization=details.get("quantization_level"),
+                )
+                if known is not None and known.digest == info.digest:
+                    info.context_length = known.context_length
+                else:
+                    info.context_length = self._fetch_context_length(name)
+                loaded = running.get(name)
+                if loaded is not None:
+                    info.loaded = True
+                    info.size_vram = loaded.get("size_vram")
+                    info.expires_at = loaded.get("expires_at")
+                models[name] = info
+            self.models = models
+            self.reachable = True
+            self.refreshed_at = time.time()
+            self.ready.set()
+            logging.debug(f"Model catalog refreshed in {(time.monotonic() - started) * 1000:.0f} ms: {len(models)} models")
+
+    def _fetch_context_length(self, name: str) -> Optional[int]:
+        try:
+            model_info = self.http.show(name).get("model_info") or {}
+        except Exception as e:
+            logging.warning(f"Could not get details of {name}: {e}")
+            return None
+        # Keys are prefixed with the architecture, e.g. "llama.context_length"
+        architecture = model_info.get("general.architecture")
+        value = model_info.get(f"{architecture}.context_length")
+        if value is None:
+            value = next((v for k, v in model_info.items() if k.endswith(".context_length")), None)
+        return int(value) if value else None
+
+    def get(self, name: str) -> Optional[ModelInfo]:
+        return self.models.get(name)
+
+    def context_length(self, name: str) -> Optional[int]:
+        info = self.models.get(name)
+        return info.context_length if info else None
+
+    def is_loaded(self, name: str) -> Optional[bool]:
+        """Whether the model is in memory, None if the model is unknown."""
+        info = self.models.get(name)
+        return info.loaded if info else None
+
+    def mark_loaded(self, name: str):
+        """Record that a request just ran on the model, without waiting for the next refresh."""
+        info = self.models.get(name)
+        if info is not None:
+            info.loaded = True
+
+    def available(self) -> List[Dict[str, str]]:
+        """The models as value/label options for the UI."""
+        names = sorted(self.models) or [self.fallback_model]
+        return [{"value": name, "label": name} for name in names]
+
+    def describe(self) -> Dict:
+        return {
+            "reachable": self.reachable,
+            "refreshed_at": self.refreshed_at,
+            "models": [info.to_dict() for info in self.models.values()],
+        }
@@ -0,0 +1,118 @@
+from typing import Dict, Generator, List, Union
+import json
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class OllamaError(Exception):
+    """Ollama answered with an error status or an error line in a stream."""
+
+
+class OllamaHTTP:
+    """
+    Shared client for Ollama's REST API.
+
+    All requests go through one requests.Session, so connections are kept alive and reused
+    instead of opening a new TCP connection per request. Requests that fail before a response
+    arrives (e.g. a pooled connection the server closed while idle) are retried with backoff.
+    """
+
+    def __init__(self, base_url: str = "http://localhost:11434", connect_timeout: float = 5.0,
+                 read_timeout: float = 300.0, retries: int = 2, backoff: float = 0.3, pool_size: int = 8):
+        """
+        :param base_url: The Ollama server.
+        :param connect_timeout: Seconds to wait for a connection.
+        :param read_timeout: Seconds to wait for the next bytes; covers loading a model before the first token.
+        :param retries: Retries for connection errors, resets and 502/503/504 answers.
+        :param backoff: Backoff factor in seconds between retries (0.3, 0.6, 1.2, ...).
+        :param pool_size: Connections kept open to the server, at least the number of parallel requests.
+        """
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=retries,
+            status=retries,
+            backoff_factor=backoff,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),  # Nothing is retried once the response started
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _post(self, path: str, payload: Dict, stream: bool = False) -> requests.Response:
+        response = self.session.post(f"{self.base_url}{path}", json=payload, stream=stream, timeout=self.timeout)
+        if response.status_code != 200:
+            try:
+                raise OllamaError(f"Ollama API error: {response.text}")
+            finally:
+                response.close()
+        return response
+
+    def request(self, path: str, payload: Dict) -> Dict:
+        """POST a request and return the decoded JSON answer."""
+        with self._post(path, payload) as response:
+            return response.json()
+
+    def stream(self, path: str, payload: Dict) -> Generator[Dict, None, None]:
+        """
+        POST a streaming request and yield each NDJSON object as soon as its line arrives.
+
+        Closing the generator early closes the connection, which stops the generation in Ollama.
+        """
+        with self._post(path, dict(payload, stream=True), stream=True) as response:
+            for line in response.iter_lines(chunk_size=8192):
+                if not line:
+                    continue
+                part = json.loads(line)
+                if "error" in part:
+                    raise OllamaError(part["error"])
+                yield part
+
+    def chat(self, model: str, messages: List[Dict], stream: bool = True, **kwargs) -> Union[Generator[Dict, None, None], Dict]:
+        """
+        /api/chat, extra keyword arguments (options, keep_alive, ...) go into the request body.
+
+        :return: A generator of response chunks if streaming, else the full response.
+        """
+        payload = dict(kwargs, model=model, messages=messages)
+        if stream:
+            return self.stream("/api/chat", payload)
+        return self.request("/api/chat", dict(payload, stream=False))
+
+    def generate(self, model: str, prompt: str, **kwargs) -> Dict:
+        """Non-streaming /api/generate."""
+        return self.request("/api/generate", dict(kwargs, model=model, prompt=prompt, stream=False))
+
+    def embed(self, model: str, input: Union[str, List[str]], **kwargs) -> List[List[float]]:
+        """One embedding per input text, from /api/embed."""
+        return self.request("/api/embed", dict(kwargs, model=model, input=input))["embeddings"]
+
+    def _get(self, path: str) -> Dict:
+        with self.session.get(f"{self.base_url}{path}", timeout=self.timeout) as response:
+            if response.status_code != 200:
+                raise OllamaError(f"Ollama API error: {response.text}")
+            return response.json()
+
+    def list_models(self) -> List[Dict]:
+        """The locally available models from /api/tags."""
+        return self._get("/api/tags").get("models", [])
+
+    def running_models(self) -> List[Dict]:
+        """The models currently loaded in memory, from /api/ps."""
+        return self._get("/api/ps").get("models", [])
+
+    def show(self, model: str) -> Dict:
+        """A model's details, parameters and architecture info from /api/show."""
+        return self.request("/api/show", {"model": model})
+
+    def close(self):
+        logging.debug("Closing Ollama HTTP session")
+        self.session.close()
@@ -0,0 +1,83 @@
+from pathlib import Path
+from string import Template
+from typing import Dict, List, Optional
+import threading
+import logging
+
+
+class PromptRegistry:
+    """
+    The system prompt templates from prompts/system.<name>.txt, read once and kept in memory.
+
+    Templates may use $variables (see render()). A background thread re-reads the folder when a
+    file is added, changed or removed, so edits show up without a restart or any I/O per chat.
+    """
+
+    def __init__(self, folder: Optional[Path] = None, reload_interval: float = 2.0):
+        """
+        :param folder: The template folder, defaults to the prompts folder next to this file.
+        :param reload_interval: Seconds between checks for changed files, 0 disables hot reloading.
+        """
+        self.folder = Path(folder) if folder else Path(__file__).resolve().parent / "prompts"
+        self.reload_interval = reload_interval
+        self.templates: Dict[str, Template] = {}
+        self._stamps = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.load()
+
+    def _scan(self) -> Dict[Path, tuple]:
+        stamps = {}
+        try:
+            for path in self.folder.glob("system.*.txt"):
+                stat = path.stat()
+                stamps[path] = (stat.st_mtime_ns, stat.st_size)
+        except OSError as e:
+            logging.error(f"Could not read prompt templates from {self.folder}: {e}")
+        return stamps
+
+    def load(self, stamps: Optional[Dict[Path, tuple]] = None):
+        """(Re)read every template file."""
+        stamps = self._scan() if stamps is None else stamps
+        templates = {}
+        for path in stamps:
+            try:
+                templates[path.name[len("system."):-len(".txt")]] = Template(path.read_text(encoding="utf-8"))
+            except (OSError, UnicodeDecodeError) as e:
+                logging.error(f"Could not read prompt template {path}: {e}")
+        # Swapped in one assignment, readers never see a half-loaded registry
+        self.templates = templates
+        self._stamps = stamps
+        logging.info(f"Loaded {len(templates)} prompt templates from {self.folder}")
+
+    def start(self):
+        """Start watching the folder for changes."""
+        if self.reload_interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._watch, daemon=True, name="prompt-templates")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _watch(self):
+        while not self._stop.wait(self.reload_interval):
+            stamps = self._scan()
+            if stamps != self._stamps:
+                self.load(stamps)
+
+    def names(self) -> List[str]:
+        return sorted(self.templates)
+
+    def render(self, name: str, default: str = "general", **variables) -> str:
+        """
+        Fill in a template.
+
+        :param name: The template name, e.g. "code" for system.code.txt.
+        :param default: The template used when there is none called name.
+        :param variables: Values for $name / ${name} placeholders; unknown placeholders are left as they are.
+        """
+        templates = self.templates
+        template = templates.get(name) or templates.get(default)
+        if template is None:
+            return ""
+        return template.safe_substitute(variables)
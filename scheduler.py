@@ -0,0 +1,146 @@
+from collections import defaultdict
+from contextlib import contextmanager, asynccontextmanager
+from enum import IntEnum
+from itertools import count
+from typing import Dict, Optional
+import asyncio
+import bisect
+import threading
+import logging
+
+
+class Priority(IntEnum):
+    """Request priorities, lower runs first."""
+    INTERACTIVE = 0  # Chat replies the user is watching
+    ENHANCE = 1      # Prompt enhancement, the user is waiting for it
+    BACKGROUND = 2   # Titles and history summaries
+    IDLE = 3         # Work that only runs while nothing else does
+
+
+class GenerationCancelled(Exception):
+    """Raised when a request is cancelled while it waits for a slot."""
+
+
+class CancellationToken:
+    """Per-stream stop flag, set from the UI thread and polled by the generating one."""
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+class GenerationScheduler:
+    """
+    Limits how many requests run against each Ollama model at once.
+
+    Waiting requests are served by priority, then first come, first served per model, so a
+    chat that keeps asking cannot starve another one and background work never delays a reply.
+    """
+
+    def __init__(self, max_per_model: int = 2, max_per_model_overrides: Optional[Dict[str, int]] = None):
+        """
+        :param max_per_model: Concurrent requests per model; match OLLAMA_NUM_PARALLEL for best throughput.
+        :param max_per_model_overrides: Limits per model name.
+        """
+        self.max_per_model = max_per_model
+        self.overrides = max_per_model_overrides or {}
+        self.condition = threading.Condition()
+        self.running: Dict[str, int] = defaultdict(int)
+        self.waiting: Dict[str, list] = defaultdict(list)  # Sorted (priority, sequence) tickets
+        self._sequence = count()
+        self.catalog = None  # A ModelCatalog; Model sets its own so cold models are loaded by one request
+
+    def limit_for(self, model_name: str) -> int:
+        # While a model is known to be unloaded, only one request runs: it loads the model and the
+        # others follow on a warm model instead of all waiting on (and competing for memory during) the load
+        if self.catalog is not None and self.catalog.is_loaded(model_name) is False:
+            return 1
+        return max(1, self.overrides.get(model_name, self.max_per_model))
+
+    def _enqueue(self, model_name: str, priority: int) -> tuple:
+        ticket = (int(priority), next(self._sequence))
+        bisect.insort(self.waiting[model_name], ticket)
+        return ticket
+
+    def _try_start(self, model_name: str, ticket: tuple) -> bool:
+        """Take a slot if the ticket is first in line and one is free. Call with the condition held."""
+        queue = self.waiting[model_name]
+        if queue[0] != ticket or self.running[model_name] >= self.limit_for(model_name):
+            return False
+        queue.remove(ticket)
+        self.running[model_name] += 1
+        if len(queue):
+            logging.debug(f"{model_name}: {len(queue)} requests waiting")
+        self.condition.notify_all()
+        return True
+
+    def _abandon(self, model_name: str, ticket: tuple):
+        with self.condition:
+            self.waiting[model_name].remove(ticket)
+            self.condition.notify_all()
+
+    def _release(self, model_name: str):
+        if self.catalog is not None:
+            self.catalog.mark_loaded(model_name)  # The request just ran on it
+        with self.condition:
+            self.running[model_name] -= 1
+            self.condition.notify_all()
+
+    @contextmanager
+    def slot(self, model_name: str, token: Optional[CancellationToken] = None, priority: int = Priority.INTERACTIVE):
+        """
+        Hold one of the model's slots for the duration of the with-block.
+
+        :param priority: A Priority; waiting requests with a lower value get the next free slot.
+        :raises GenerationCancelled: If the token is cancelled before a slot frees up.
+        """
+        with self.condition:
+            ticket = self._enqueue(model_name, priority)
+            try:
+                while not self._try_start(model_name, ticket):
+                    if token and token.cancelled:
+                        raise GenerationCancelled()
+                    self.condition.wait(timeout=0.1)
+            except BaseException:
+                self._abandon(model_name, ticket)
+                raise
+        try:
+            yield
+        finally:
+            self._release(model_name)
+
+    @asynccontextmanager
+    async def async_slot(self, model_name: str, token: Optional[CancellationToken] = None,
+                         priority: int = Priority.INTERACTIVE, poll_interval: float = 0.02):
+        """slot() for coroutines, waits without blocking the event loop."""
+        with self.condition:
+            ticket = self._enqueue(model_name, priority)
+        try:
+            while True:
+                with self.condition:
+                    if self._try_start(model_name, ticket):
+                        break
+                if token and token.cancelled:
+                    raise GenerationCancelled()
+                await asyncio.sleep(poll_interval)
+        except BaseException:
+            self._abandon(model_name, ticket)
+            raise
+        try:
+            yield
+        finally:
+            self._release(model_name)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self.condition:
+            models = set(self.running) | set(self.waiting)
+            return {
+                model_name: {"running": self.running[model_name], "waiting": len(self.waiting[model_name])}
+                for model_name in models
+            }
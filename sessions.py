@@ -0,0 +1,150 @@
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional, Union
+import threading
+import logging
+import time
+
+from metrics import metrics, RATE
+
+
+@dataclass
+class RequestTiming:
+    """Wall-clock timestamps of one generation request (time.monotonic seconds)."""
+    model_name: str
+    chat_id: Optional[str]
+    started: float
+    first_token: Optional[float] = None
+    finished: Optional[float] = None
+    # Ollama's counters from the final chunk of the reply, durations in nanoseconds
+    eval_count: Optional[int] = None
+    eval_duration: Optional[int] = None
+    prompt_eval_count: Optional[int] = None
+    prompt_eval_duration: Optional[int] = None
+    load_duration: Optional[int] = None
+
+    COUNTERS = ("eval_count", "eval_duration", "prompt_eval_count", "prompt_eval_duration", "load_duration")
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Time to first token in seconds."""
+        return self.first_token - self.started if self.first_token is not None else None
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        """Generation speed as measured by Ollama."""
+        if not self.eval_count or not self.eval_duration:
+            return None
+        return self.eval_count / (self.eval_duration / 1e9)
+
+    def add_counters(self, chunk):
+        """Take the counters from a response chunk (a dict or an ollama response), if it has them."""
+        for name in self.COUNTERS:
+            value = chunk.get(name)
+            if value is not None:
+                setattr(self, name, value)
+
+
+class SessionManager:
+    """
+    Keeps models loaded in Ollama and the request options stable between turns.
+
+    Ollama reuses its KV cache when a request shares a prefix with the previous one on the
+    same loaded model. A model is unloaded after keep_alive and reloaded whenever options such
+    as num_ctx change, so every request for a model goes out with the same keep_alive and options.
+    """
+
+    def __init__(self, keep_alive: Union[str, int] = "30m", keep_alive_per_model: Optional[Dict[str, Union[str, int]]] = None,
+                 context_size=None, history: int = 200):
+        """
+        :param keep_alive: How long Ollama keeps a model loaded after a request (e.g. "30m", -1 for ever).
+        :param keep_alive_per_model: keep_alive overrides per model name.
+        :param context_size: Callable returning the num_ctx to request for a model name, or None for Ollama's default.
+        :param history: How many request timings are kept for stats().
+        """
+        self.keep_alive = keep_alive
+        self.keep_alive_per_model = keep_alive_per_model or {}
+        self.context_size = context_size
+        self.timings = deque(maxlen=history)
+        self.lock = threading.Lock()
+        self._preloading = set()
+        self.http = None  # An OllamaHTTP client; Model sets its own so preloads share the connection pool
+        self.catalog = None  # A ModelCatalog; Model sets its own so loaded models are not preloaded again
+
+    def keep_alive_for(self, model_name: str) -> Union[str, int]:
+        return self.keep_alive_per_model.get(model_name, self.keep_alive)
+
+    def options_for(self, model_name: str) -> Dict:
+        """Options sent with every request for the model; changing them makes Ollama reload it."""
+        options = {}
+        if self.context_size:
+            options["num_ctx"] = self.context_size(model_name)
+        return options
+
+    def request_args(self, model_name: str) -> Dict:
+        """Keyword arguments for ollama.chat / ollama.generate."""
+        return {"keep_alive": self.keep_alive_for(model_name), "options": self.options_for(model_name)}
+
+    def preload(self, model_name: str):
+        """Load the model in the background so the first reply in a chat does not pay for it."""
+        with self.lock:
+            if not model_name or model_name in self._preloading:
+                return
+            if self.catalog is not None and self.catalog.is_loaded(model_name):
+                return
+            self._preloading.add(model_name)
+        threading.Thread(target=self._preload, args=(model_name,), daemon=True, name=f"preload-{model_name}").start()
+
+    def _preload(self, model_name: str):
+        try:
+            started = time.monotonic()
+            # A request without a prompt only loads the model
+            client = self.http
+            if client is None:
+                import ollama as client
+            client.generate(model=model_name, prompt="", **self.request_args(model_name))
+            logging.info(f"Preloaded {model_name} in {time.monotonic() - started:.2f}s")
+            if self.catalog is not None:
+                self.catalog.mark_loaded(model_name)
+        except Exception as e:
+            logging.warning(f"Preloading {model_name} failed: {e}")
+        finally:
+            with self.lock:
+                self._preloading.discard(model_name)
+
+    def start_request(self, model_name: str, chat_id: Optional[str] = None) -> RequestTiming:
+        return RequestTiming(model_name=model_name, chat_id=chat_id, started=time.monotonic())
+
+    def finish_request(self, timing: RequestTiming):
+        timing.finished = time.monotonic()
+        with self.lock:
+            self.timings.append(timing)
+        if timing.ttft is not None:
+            metrics.observe("ttft_ms", timing.ttft * 1000)
+            logging.debug(f"{timing.model_name}: first token after {timing.ttft * 1000:.0f} ms")
+        if timing.tokens_per_second is not None:
+            metrics.observe("tokens_per_second", timing.tokens_per_second, unit="tokens/s", bounds=RATE)
+        if timing.prompt_eval_duration:
+            metrics.observe("prompt_eval_ms", timing.prompt_eval_duration / 1e6)
+        if timing.load_duration:
+            metrics.observe("model_load_ms", timing.load_duration / 1e6)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Time-to-first-token statistics per model over the recent requests, in milliseconds."""
+        with self.lock:
+            timings = list(self.timings)
+        per_model: Dict[str, list] = {}
+        for timing in timings:
+            if timing.ttft is not None:
+                per_model.setdefault(timing.model_name, []).append(timing.ttft * 1000)
+        stats = {}
+        for model_name, values in per_model.items():
+            ordered = sorted(values)
+            stats[model_name] = {
+                "requests": len(values),
+                "ttft_last_ms": round(values[-1], 1),
+                "ttft_avg_ms": round(sum(values) / len(values), 1),
+                "ttft_p50_ms": round(ordered[len(ordered) // 2], 1),
+                "ttft_p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+            }
+        return stats
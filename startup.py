@@ -0,0 +1,51 @@
+from contextlib import contextmanager
+from typing import Dict, List
+import threading
+import logging
+import time
+
+
+class StartupTimer:
+    """Records how long each startup phase took, relative to when this module was imported."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.phases: List[Dict] = []
+
+    def _record(self, name: str, start: float, end: float):
+        with self.lock:
+            self.phases.append({
+                "name": name,
+                "thread": threading.current_thread().name,
+                "start_ms": round((start - self.started) * 1000, 1),
+                "duration_ms": round((end - start) * 1000, 1),
+            })
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, start, time.perf_counter())
+
+    def mark(self, name: str):
+        """Record a point in time, e.g. "window shown"."""
+        now = time.perf_counter()
+        self._record(name, now, now)
+
+    def report(self) -> Dict:
+        with self.lock:
+            phases = sorted(self.phases, key=lambda phase: phase["start_ms"])
+        return {"phases": phases, "elapsed_ms": round((time.perf_counter() - self.started) * 1000, 1)}
+
+    def log(self):
+        lines = [
+            f"  {phase['start_ms']:>8.1f} ms  {phase['duration_ms']:>8.1f} ms  {phase['name']} [{phase['thread']}]"
+            for phase in self.report()["phases"]
+        ]
+        logging.info("Startup phases (start, duration):\n" + "\n".join(lines))
+
+
+timer = StartupTimer()
@@ -1,6 +1,12 @@
 let currentChatId = null;
 let isSidebarOpen = false;
 let isGenerating = false;
+let isSemanticSearch = false;
+let searchTimeout = null;
+let messagesCursor = null;
+let hasMoreMessages = false;
+let isLoadingMessages = false;
+let messageObserver = null;
 
 // Remove local assistantMessageElement – we'll use the global one defined in global.js
 
@@ -46,6 +52,38 @@ function setSidebarState(open) {
     }
 }
 
+// Messages are parsed with marked and highlighted only once they come close to the viewport
+function getMessageObserver() {
+    if (!messageObserver) {
+        messageObserver = new IntersectionObserver(entries => {
+            entries.forEach(entry => {
+                if (!entry.isIntersecting) return;
+                messageObserver.unobserve(entry.target);
+                entry.target.replaceWith(createMessageElement(entry.target.message));
+            });
+        }, { root: document.getElementById('messagesContainer'), rootMargin: '800px 0px' });
+    }
+    return messageObserver;
+}
+
+function createLazyMessageElement(message) {
+    const div = document.createElement('div');
+    div.className = `message ${message.role} pending`;
+    const content = document.createElement('div');
+    content.className = 'message-content';
+    content.textContent = message.content;
+    div.appendChild(content);
+    div.message = message;
+    getMessageObserver().observe(div);
+    return div;
+}
+
+function createMessagesFragment(messages) {
+    const fragment = document.createDocumentFragment();
+    messages.forEach(message => fragment.appendChild(createLazyMessageElement(message)));
+    return fragment;
+}
+
 function loadMessages() {
     if (!currentChatId) {
         console.error("No current chat ID available");
@@ -59,7 +97,7 @@ function loadMessages() {
             setTimeout(() => window.location.href = 'index.html', 2000);
             return;
         }
-        console.log("Loaded chat:", chat);
+        console.log("Loaded chat:", chat.id, `(${chat.messages.length} of ${chat.message_count} messages)`);
         const container = document.getElementById('messagesContainer');
         if (!container) {
             console.error("Messages container not found");
@@ -77,15 +115,29 @@ function loadMessages() {
             `;
             return;
         }
-        console.log(`Adding ${chat.messages.length} messages to chat`);
-        chat.messages.forEach((message, index) => {
-            console.log(`Adding message ${index + 1}/${chat.messages.length}`);
-            container.appendChild(createMessageElement(message));
-        });
+        messagesCursor = chat.cursor;
+        hasMoreMessages = chat.has_more;
+        container.appendChild(createMessagesFragment(chat.messages));
         container.scrollTop = container.scrollHeight;
     });
 }
 
+function loadOlderMessages() {
+    if (!hasMoreMessages || isLoadingMessages) return;
+    isLoadingMessages = true;
+    eel.get_chat(currentChatId, messagesCursor)(function(chat) {
+        isLoadingMessages = false;
+        if (!chat) return;
+        const container = document.getElementById('messagesContainer');
+        const previousHeight = container.scrollHeight;
+        container.insertBefore(createMessagesFragment(chat.messages), container.firstChild);
+        // Keep the messages the user is looking at in place
+        container.scrollTop += container.scrollHeight - previousHeight;
+        messagesCursor = chat.cursor;
+        hasMoreMessages = chat.has_more;
+    });
+}
+
 marked.setOptions({
     highlight: function(code, lang) {
         if (lang && hljs.getLanguage(lang)) {
@@ -164,18 +216,27 @@ function addMessageToUI(message) {
 }
 
 function updateChatTitle(chatId) {
+    // Answers at once when the title is current, otherwise the new title arrives through receive_title
     eel.generate_title(chatId)(function(response) {
-        if (!response.error) {
-            const headerTitle = document.getElementById('headerTitle');
-            if (headerTitle) {
-                headerTitle.textContent = response.title;
-            }
-            // Update sidebar if open
-            document.querySelectorAll('.sidebar-chat').forEach(chatElement => {
-                if (chatElement.querySelector('.sidebar-chat-title').textContent === response.title) {
-                    chatElement.querySelector('.sidebar-chat-title').textContent = response.title;
-                }
-            });
+        if (response.title) {
+            receive_title(chatId, response);
+        }
+    });
+}
+
+eel.expose(receive_title);
+function receive_title(chatId, response) {
+    if (response.error) return;
+    if (chatId === currentChatId) {
+        const headerTitle = document.getElementById('headerTitle');
+        if (headerTitle) {
+            headerTitle.textContent = response.title;
+        }
+    }
+    // Update sidebar if open
+    document.querySelectorAll('.sidebar-chat').forEach(chatElement => {
+        if (chatElement.dataset.chatId === chatId) {
+            chatElement.querySelector('.sidebar-chat-title').textContent = response.title;
         }
     });
 }
@@ -201,22 +262,21 @@ async function start_generating() {
             document.getElementById('messagesContainer').appendChild(assistantMessageElement);
         });
         
-        // Start generation without saving to history immediately
-        await eel.start_generating(input)();
+        // Returns once the reply started; receive_chunk and generation_complete take it from there
+        const result = await eel.start_generating(input, currentChatId)();
+        if (result && result.error) {
+            handle_generation_error(`<ERROR>${result.error}</ERROR>`);
+        }
     } catch (error) {
         handle_generation_error(`<ERROR>${error.message}</ERROR>`);
-    } finally {
-        isGenerating = false;
-        document.getElementById('stopButton').style.display = 'none';
     }
-    updateChatTitle(currentChatId);
 }
 
 // Add stop handler
 function stop_generating() {
     if (!isGenerating) return;
     
-    eel.stop_generating()(function(response) {
+    eel.stop_generating(currentChatId)(function(response) {
         console.log("Generation stopped:", response);
     });
     
@@ -238,18 +298,32 @@ function enhance_prompt() {
     if (!input) return;
     showPopupMessage('Enhancing prompt...');
     inputTextArea.classList.add("rainbowBorder")
+    // Returns once queued; the enhanced prompt arrives through receive_enhanced_prompt
     eel.enhance_prompt(input)(function(response) {
         if (response.error) {
-            showPopupMessage(`Error: ${response.error}`);
-        } else {
-            const inputTextArea = document.getElementById('inputTextArea');
-            inputTextArea.value = response;
-            showPopupMessage('Prompt enhanced!');
-            inputTextArea.classList.remove("rainbowBorder")
+            receive_enhanced_prompt(currentChatId, response);
         }
     });
 }
 
+eel.expose(receive_enhanced_prompt);
+function receive_enhanced_prompt(chatId, response) {
+    if (chatId !== currentChatId) return;
+    const inputTextArea = document.getElementById('inputTextArea');
+    inputTextArea.classList.remove("rainbowBorder")
+    if (response.error) {
+        showPopupMessage(`Error: ${response.error}`);
+    } else {
+        inputTextArea.value = response.prompt;
+        showPopupMessage('Prompt enhanced!');
+    }
+}
+
+eel.expose(chats_ready);
+function chats_ready() {
+    loadSidebarChats();
+}
+
 function loadSidebarChats() {
     console.log("Loading sidebar chats...");
     eel.get_chats()(function(chats) {
@@ -260,6 +334,11 @@ function loadSidebarChats() {
             return;
         }
         sidebarContainer.innerHTML = '';
+        if (chats === null) {
+            // The chat index is still loading, chats_ready reloads the list
+            sidebarContainer.innerHTML = '<div class="sidebar-empty-state"><p>Loading chats…</p></div>';
+            return;
+        }
         if (!chats || chats.length === 0) {
             console.log("No chats found, showing empty state");
             sidebarContainer.innerHTML = '<div class="sidebar-empty-state"><p>No chats yet</p></div>';
@@ -285,6 +364,7 @@ function createSidebarChatElement(chat) {
     console.log("Creating sidebar element for chat:", chat);
     const div = document.createElement('div');
     div.className = `sidebar-chat ${chat.id === currentChatId ? 'active' : ''}`;
+    div.dataset.chatId = chat.id;
     const title = document.createElement('div');
     title.className = 'sidebar-chat-title';
     title.textContent = chat.title || 'Untitled Chat';
@@ -292,6 +372,13 @@ function createSidebarChatElement(chat) {
     meta.className = 'sidebar-chat-meta';
     meta.textContent = new Date(chat.last_message_at).toLocaleString();
     div.appendChild(title);
+    if (chat.snippet) {
+        // The snippet is escaped by the backend, only <mark> tags are left as HTML
+        const snippet = document.createElement('div');
+        snippet.className = 'sidebar-chat-snippet';
+        snippet.innerHTML = chat.snippet;
+        div.appendChild(snippet);
+    }
     div.appendChild(meta);
     div.onclick = () => {
         if (chat.id !== currentChatId) {
@@ -305,13 +392,9 @@ function createSidebarChatElement(chat) {
 function showNewChatPopup() {
     const popup = document.getElementById('newChatPopup');
     const chatTypeSelect = document.getElementById('chatTypeSelect');
-    const modelSelect = document.getElementById('modelSelect');
     while (chatTypeSelect.options.length > 1) {
         chatTypeSelect.remove(1);
     }
-    while (modelSelect.options.length > 1) {
-        modelSelect.remove(1);
-    }
     eel.get_chat_types()(function(chatTypes) {
         chatTypes.forEach(type => {
             const option = document.createElement('option');
@@ -320,6 +403,16 @@ function showNewChatPopup() {
             chatTypeSelect.appendChild(option);
         });
     });
+    loadModelOptions();
+    popup.style.display = 'flex';
+}
+
+// Fills the model select; called again when models_ready reports the list Ollama sent
+function loadModelOptions() {
+    const modelSelect = document.getElementById('modelSelect');
+    while (modelSelect.options.length > 1) {
+        modelSelect.remove(1);
+    }
     eel.get_available_models()(function(models) {
         models.forEach(model => {
             const option = document.createElement('option');
@@ -328,7 +421,13 @@ function showNewChatPopup() {
             modelSelect.appendChild(option);
         });
     });
-    popup.style.display = 'flex';
+}
+
+eel.expose(models_ready);
+function models_ready() {
+    if (document.getElementById('newChatPopup').style.display === 'flex') {
+        loadModelOptions();
+    }
 }
 
 function closeNewChatPopup() {
@@ -360,20 +459,77 @@ function createNewChat() {
     });
 }
 
+let metricsTimer = null;
+let lastBridgeRoundtrip = null;
+
+function showMetricsPanel() {
+    document.getElementById('metricsPopup').style.display = 'flex';
+    refreshMetrics();
+    metricsTimer = setInterval(refreshMetrics, 2000);
+}
+
+function closeMetricsPanel() {
+    document.getElementById('metricsPopup').style.display = 'none';
+    clearInterval(metricsTimer);
+    metricsTimer = null;
+}
+
+function refreshMetrics() {
+    const sent = performance.now();
+    // Each call reports the round trip of the previous one
+    eel.get_metrics(lastBridgeRoundtrip)(function(histograms) {
+        lastBridgeRoundtrip = performance.now() - sent;
+        renderMetrics(histograms);
+    });
+}
+
+function renderMetrics(histograms) {
+    const body = document.getElementById('metricsTableBody');
+    const format = value => value === null || value === undefined ? '–' : Number(value).toFixed(1);
+    body.innerHTML = '';
+    Object.entries(histograms).forEach(([name, histogram]) => {
+        const row = document.createElement('tr');
+        [name, histogram.unit, histogram.count, format(histogram.p50), format(histogram.p95), format(histogram.max)].forEach(value => {
+            const cell = document.createElement('td');
+            cell.textContent = value;
+            row.appendChild(cell);
+        });
+        body.appendChild(row);
+    });
+    if (!body.children.length) {
+        body.innerHTML = '<tr><td colspan="6">Nothing recorded yet</td></tr>';
+    }
+}
+
 
 
+function toggleSemanticSearch() {
+    isSemanticSearch = !isSemanticSearch;
+    document.getElementById('semanticSearchButton').classList.toggle('active', isSemanticSearch);
+    searchChats(document.getElementById('searchInput').value);
+}
+
 function searchChats(query) {
+    clearTimeout(searchTimeout);
     if (!query.trim()) {
         loadSidebarChats();
         return;
     }
-    eel.search_chats(query)(function(chats) {
-        const chatsList = document.getElementById('chatsList');
-        chatsList.innerHTML = '';
-        chats.forEach(chat => {
-            const chatElement = createSidebarChatElement(chat);
-            chatsList.appendChild(chatElement);
-        });
+    if (isSemanticSearch) {
+        // Every semantic query is embedded by Ollama, so wait until typing pauses
+        searchTimeout = setTimeout(() => eel.find_similar_chats(query)(renderSearchResults), 300);
+        return;
+    }
+    // Keyword search is fast, but every call still crosses the bridge; skip the keystrokes in between
+    searchTimeout = setTimeout(() => eel.search_chats(query)(renderSearchResults), 120);
+}
+
+function renderSearchResults(chats) {
+    const chatsList = document.getElementById('chatsList');
+    chatsList.innerHTML = '';
+    chats.forEach(chat => {
+        const chatElement = createSidebarChatElement(chat);
+        chatsList.appendChild(chatElement);
     });
 }
 
@@ -416,7 +572,8 @@ window.onload = function() {
     if (currentChatId) {
         (async function updateHeaderTitle() {
             try {
-                const chat = await eel.get_chat(currentChatId)();
+                // Only the title is needed here, so ask for an empty page
+                const chat = await eel.get_chat(currentChatId, null, 0)();
                 if (chat && chat.title) {
                     const headerTitle = document.getElementById('headerTitle');
                     if (headerTitle) {
@@ -445,6 +602,13 @@ window.onload = function() {
     if (currentChatId) {
         console.log("Loading messages for chat:", currentChatId);
         setTimeout(loadMessages, 100);
+        const container = document.getElementById('messagesContainer');
+        if (container) {
+            // Fetch the previous page before the user reaches the top
+            container.addEventListener('scroll', () => {
+                if (container.scrollTop < 300) loadOlderMessages();
+            });
+        }
     } else {
         const container = document.getElementById('messagesContainer');
         if (container) {
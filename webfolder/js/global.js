@@ -237,8 +237,92 @@ document.addEventListener('keydown', function(event) {
     inputTextArea.focus();
 });
 
+// Renders a streamed markdown reply incrementally. Completed blocks are parsed and
+// highlighted once and then left alone; only the still-open trailing block is re-rendered.
+// finish() replaces the blocks with a single rendering of the whole reply.
+class StreamingRenderer {
+    constructor(container) {
+        this.container = container;
+        this.container.innerHTML = '';
+        this.frozen = document.createElement('div');
+        this.tail = document.createElement('div');
+        this.container.appendChild(this.frozen);
+        this.container.appendChild(this.tail);
+        this.raw = '';
+        this.frozenLength = 0;  // Characters of raw already rendered into frozen blocks
+        this.scanned = 0;       // Characters of raw already split into lines
+        this.boundary = 0;      // Last position where a block can safely end
+        this.fence = null;      // Marker of the open code fence, if any
+        this.inThink = false;
+    }
+
+    static toHtml(markdown) {
+        return marked.parse(markdown
+            .replace(/<think(.*?)>/g, '<div class="think-container">')
+            .replace(/<\/think>/g, '</div>'));
+    }
+
+    // Walk the complete lines that arrived since the last call and remember where blocks end:
+    // after a blank line or a closing code fence, but never inside a fence or a <think> block.
+    scan() {
+        let lineEnd;
+        while ((lineEnd = this.raw.indexOf('\n', this.scanned)) !== -1) {
+            const line = this.raw.slice(this.scanned, lineEnd);
+            this.scanned = lineEnd + 1;
+            const fenceMatch = line.match(/^ {0,3}(`{3,}|~{3,})/);
+            if (this.fence) {
+                if (fenceMatch && fenceMatch[1][0] === this.fence[0] && fenceMatch[1].length >= this.fence.length
+                        && !line.slice(fenceMatch[0].length).trim()) {
+                    this.fence = null;
+                    if (!this.inThink) this.boundary = this.scanned;
+                }
+                continue;
+            }
+            if (fenceMatch) {
+                this.fence = fenceMatch[1];
+                continue;
+            }
+            if (/<think.*?>/.test(line)) this.inThink = true;
+            if (line.includes('</think>')) {
+                this.inThink = false;
+                this.boundary = this.scanned;
+            } else if (!this.inThink && !line.trim()) {
+                this.boundary = this.scanned;
+            }
+        }
+    }
+
+    freeze(markdown) {
+        const block = document.createElement('div');
+        block.innerHTML = StreamingRenderer.toHtml(markdown);
+        // Every fence in a frozen block is closed, so each code block is highlighted exactly once
+        block.querySelectorAll('pre code').forEach(code => hljs.highlightBlock(code));
+        this.frozen.appendChild(block);
+    }
+
+    append(chunk) {
+        this.raw += chunk;
+        this.scan();
+        if (this.boundary > this.frozenLength) {
+            this.freeze(this.raw.slice(this.frozenLength, this.boundary));
+            this.frozenLength = this.boundary;
+        }
+        this.tail.innerHTML = StreamingRenderer.toHtml(this.raw.slice(this.frozenLength));
+    }
+
+    // Block-by-block rendering can differ from a single pass, e.g. for loose lists, so the
+    // finished reply is rendered once more exactly as createMessageElement renders it after a reload.
+    finish() {
+        const rendered = createMessageElement({ role: 'assistant', content: this.raw });
+        this.container.replaceChildren(...rendered.querySelector('.message-content').childNodes);
+        this.frozenLength = this.raw.length;
+    }
+}
+
 eel.expose(receive_chunk);
-function receive_chunk(chunk) {
+function receive_chunk(chunk, chatId) {
+    // Other chats may still be generating in the background
+    if (chatId && chatId !== currentChatId) return;
     if (!isGenerating) return;
     
     if (chunk.startsWith('<ERROR>')) {
@@ -251,22 +335,11 @@ function receive_chunk(chunk) {
         document.getElementById('messagesContainer').appendChild(assistantMessageElement);
     }
     
-    const contentDiv = assistantMessageElement.querySelector('.message-content');
-    
-    // Store raw content and only parse when complete
-    if (!contentDiv.dataset.raw) contentDiv.dataset.raw = '';
-    contentDiv.dataset.raw += chunk;
-    
-    // Temporary display with placeholder for unclosed tags
-    const tempContent = contentDiv.dataset.raw
-        .replace(/<think>/g, '<div class="think-container">')
-        .replace(/<\/think>/g, '</div>')
-        .replace(/<think(.*?)>/g, '<div class="think-container">');
-    
-    contentDiv.innerHTML = marked.parse(tempContent);
-    
-    // Highlight code blocks
-    contentDiv.querySelectorAll('pre code').forEach(block => hljs.highlightBlock(block));
+    if (!assistantMessageElement.renderer) {
+        const contentDiv = assistantMessageElement.querySelector('.message-content');
+        assistantMessageElement.renderer = new StreamingRenderer(contentDiv);
+    }
+    assistantMessageElement.renderer.append(chunk);
     
     // Auto-scroll
     const container = document.getElementById('messagesContainer');
@@ -275,15 +348,32 @@ function receive_chunk(chunk) {
 
 // Expose completion handler
 eel.expose(generation_complete);
-function generation_complete() {
+function generation_complete(chatId) {
+    if (chatId && chatId !== currentChatId) return;
     document.getElementById('stopButton').style.display = 'none';
     isGenerating = false;
+    if (!assistantMessageElement) return;
+    if (assistantMessageElement.renderer) {
+        assistantMessageElement.renderer.finish();
+    }
     assistantMessageElement.classList.add("complete");
     if (currentChatId) {
         setTimeout(() => updateChatTitle(currentChatId), 1000);
     }
 }
 
+// Called instead of generation_complete when a reply was stopped before its first token
+eel.expose(generation_cancelled);
+function generation_cancelled(chatId) {
+    if (chatId && chatId !== currentChatId) return;
+    document.getElementById('stopButton').style.display = 'none';
+    isGenerating = false;
+    if (assistantMessageElement && !assistantMessageElement.renderer) {
+        assistantMessageElement.remove();  // Nothing was stored for it
+    }
+    assistantMessageElement = null;
+}
+
 function handle_generation_error(errorChunk) {
     const errorMsg = errorChunk.replace('<ERROR>', '').replace('</ERROR>', '');
     showPopupMessage(`Error: ${errorMsg}`);
@@ -292,6 +382,8 @@ function handle_generation_error(errorChunk) {
         assistantMessageElement.querySelector('.message-content').textContent = `Error: ${errorMsg}`;
     }
     
+    const stopButton = document.getElementById('stopButton');
+    if (stopButton) stopButton.style.display = 'none';
     isGenerating = false;
     assistantMessageElement = null;
 }
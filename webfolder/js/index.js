@@ -1,6 +1,7 @@
 let dragging = false;
 let startX, startY;
 let currentChatId = null;
+let searchTimeout = null;
 
 // Initialize the page
 window.onload = function() {
@@ -11,15 +12,11 @@ window.onload = function() {
 function showNewChatPopup() {
     const popup = document.getElementById('newChatPopup');
     const chatTypeSelect = document.getElementById('chatTypeSelect');
-    const modelSelect = document.getElementById('modelSelect');
     
     // Clear existing options except the first one
     while (chatTypeSelect.options.length > 1) {
         chatTypeSelect.remove(1);
     }
-    while (modelSelect.options.length > 1) {
-        modelSelect.remove(1);
-    }
     
     // Get chat types from Python and populate the select
     eel.get_chat_types()(function(chatTypes) {
@@ -31,7 +28,17 @@ function showNewChatPopup() {
         });
     });
     
-    // Get available models and populate the select
+    loadModelOptions();
+    
+    popup.style.display = 'flex';
+}
+
+// Fills the model select; called again when models_ready reports the list Ollama sent
+function loadModelOptions() {
+    const modelSelect = document.getElementById('modelSelect');
+    while (modelSelect.options.length > 1) {
+        modelSelect.remove(1);
+    }
     eel.get_available_models()(function(models) {
         models.forEach(model => {
             const option = document.createElement('option');
@@ -40,8 +47,13 @@ function showNewChatPopup() {
             modelSelect.appendChild(option);
         });
     });
-    
-    popup.style.display = 'flex';
+}
+
+eel.expose(models_ready);
+function models_ready() {
+    if (document.getElementById('newChatPopup').style.display === 'flex') {
+        loadModelOptions();
+    }
 }
 
 function closeNewChatPopup() {
@@ -79,6 +91,11 @@ function createNewChat() {
     });
 }
 
+eel.expose(chats_ready);
+function chats_ready() {
+    loadChats();
+}
+
 function loadChats() {
     console.log("Loading chats...");
     eel.get_chats()(function(chats) {
@@ -92,6 +109,12 @@ function loadChats() {
             
             container.innerHTML = '';
             
+            if (chats === null) {
+                // The chat index is still loading, chats_ready reloads the list
+                container.innerHTML = '<div class="empty-state"><p>Loading chats…</p></div>';
+                return;
+            }
+            
             if (!chats || chats.length === 0) {
                 console.log("No chats found, showing empty state");
                 const emptyState = document.createElement('div');
@@ -148,6 +171,13 @@ function createChatCard(chat) {
     actions.appendChild(deleteButton);
     
     card.appendChild(title);
+    if (chat.snippet) {
+        // The snippet is escaped by the backend, only <mark> tags are left as HTML
+        const snippet = document.createElement('div');
+        snippet.className = 'snippet';
+        snippet.innerHTML = chat.snippet;
+        card.appendChild(snippet);
+    }
     card.appendChild(meta);
     card.appendChild(actions);
     
@@ -174,12 +204,17 @@ function deleteChat(chatId) {
 
 
 function search_chats() {
+    clearTimeout(searchTimeout);
     const query = document.getElementById('searchInput').value;
     if (!query.trim()) {
         loadChats();
         return;
     }
-    
+    // Search once typing pauses instead of on every keystroke
+    searchTimeout = setTimeout(() => run_search(query), 120);
+}
+
+function run_search(query) {
     eel.search_chats(query)(function(chats) {
         const container = document.getElementById('chatsContainer');
         container.innerHTML = '';